@@ -0,0 +1,42 @@
+"""
+Positions searched by the benchmark suite
+
+Each position is (black bitboard, white bitboard, symbol of the player to move).
+They come from seeded random games and must never change, so that runs on
+different commits can be compared.
+"""
+
+MIDGAME_POSITIONS = {
+    "midgame-40": (0x081C0808A8180000, 0x5440705050404000, "B"),
+    "midgame-34": (0x4030148E1C002404, 0x20406070207E8000, "B"),
+    "midgame-28": (0x00F00014874F0400, 0x00097E2A38306140, "B"),
+    "midgame-24": (0x00387C482C0602C0, 0x008080B6D0F8F830, "B"),
+}
+
+ENDGAME_POSITIONS = {
+    "endgame-16": (0x1C80C0B61A0A000A, 0x2077274960747EE1, "B"),
+    "endgame-14": (0x35010500192BC788, 0x027E7A7E66543840, "B"),
+    "endgame-12": (0x5C7070F8742E0008, 0x820F0F070B913F13, "B"),
+    "endgame-10": (0x1FE25C5A766CC263, 0x0019A2A589133418, "B"),
+}
+
+# Final disc difference of the endgame positions for the player to move, with perfect play
+ENDGAME_SCORES = {
+    "endgame-16": 12,
+    "endgame-14": 24,
+    "endgame-12": -24,
+    "endgame-10": 2,
+}
+
+# Number of leaves of the move tree of the initial position, a pass counts as a move
+PERFT_COUNTS = {
+    1: 4,
+    2: 12,
+    3: 56,
+    4: 244,
+    5: 1396,
+    6: 8200,
+    7: 55092,
+    8: 390216,
+    9: 3005288,
+}
@@ -0,0 +1,262 @@
+"""
+Benchmark suite of the Othello engine
+
+Usage:
+    python -m benchmarks.run --perft-depth 8 --search-depth 5 --solve-empties 14 --output bench.json
+
+The results are written as a JSON document: perft counts checked against the
+known values, for each curated position the nodes, nodes per second and
+time to reach each depth of the search, and for the endgame positions the
+exact solve of the endgame solver checked against the known scores.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from loguru import logger
+from game import bitboard
+from game.othello import OthelloGame
+from game.endgame import EndgameSolver
+from benchmarks.positions import MIDGAME_POSITIONS, ENDGAME_POSITIONS, ENDGAME_SCORES, PERFT_COUNTS
+
+
+def perft(game, depth):
+    """
+    Count the leaves of the move tree of a game up to a depth
+    A pass counts as a move, a finished game is a leaf
+    """
+    moves = game.get_playable_bitboard()
+    if not moves:
+        own, opponent = game.get_own_and_opponent()
+        if not bitboard.get_moves(opponent, own):
+            return 1
+        if depth == 1:
+            return 1
+        record = game.make_move(None)
+        count = perft(game, depth - 1)
+        game.unmake_move(record)
+        return count
+
+    if depth == 1:
+        return bitboard.count(moves)
+
+    count = 0
+    for square in bitboard.iter_squares(moves):
+        record = game.make_move(bitboard.position(square))
+        count += perft(game, depth - 1)
+        game.unmake_move(record)
+    return count
+
+
+def measure(function, trace_memory=False):
+    """
+    Call a function and return its result, its duration and the peak of memory
+    allocated during the call (None if the memory is not traced)
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak_memory = None
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, duration, peak_memory
+
+
+def benchmark_perft(max_depth, trace_memory=False):
+    """
+    Run perft from the initial position for each depth up to `max_depth`
+    """
+    results = []
+    for depth in range(1, max_depth + 1):
+        game = OthelloGame()
+        game.set_players()
+        count, duration, peak_memory = measure(
+            lambda: perft(game, depth), trace_memory)
+        expected = PERFT_COUNTS.get(depth)
+        results.append({
+            "depth": depth,
+            "leaves": count,
+            "expected": expected,
+            "correct": expected is None or count == expected,
+            "seconds": round(duration, 6),
+            "leaves_per_second": round(count / duration) if duration else None,
+            "peak_memory": peak_memory,
+        })
+    return results
+
+
+def benchmark_search(name, position, max_depth, trace_memory=False):
+    """
+    Search a position by iterative deepening up to `max_depth` with a fresh player
+    """
+    black, white, symbol = position
+    game = OthelloGame.from_position((black, white), symbol)
+    player = game.current_player
+    player.reset_move_ordering()
+
+    def search():
+        iterations = []
+        best_move = None
+        start = time.perf_counter()
+        for depth in range(1, max_depth + 1):
+            best_move, best_score = player.search_root(game, depth, best_move)
+            iterations.append({
+                "depth": depth,
+                "move": list(best_move),
+                "score": best_score,
+                "nodes": player.nodes,
+                "seconds": round(time.perf_counter() - start, 6),
+            })
+        return iterations
+
+    iterations, duration, peak_memory = measure(search, trace_memory)
+    return {
+        "name": name,
+        "depth": max_depth,
+        "move": iterations[-1]["move"],
+        "score": iterations[-1]["score"],
+        "nodes": player.nodes,
+        "seconds": round(duration, 6),
+        "nodes_per_second": round(player.nodes / duration) if duration else None,
+        "table_hit_rate": round(player.transposition_table.get_hit_rate(), 4),
+        "time_to_depth": iterations,
+        "peak_memory": peak_memory,
+    }
+
+
+def benchmark_solve(name, position, trace_memory=False):
+    """
+    Solve an endgame position with the endgame solver, without any budget
+    """
+    black, white, symbol = position
+    game = OthelloGame.from_position((black, white), symbol)
+    solver = EndgameSolver()
+    (move, score), duration, peak_memory = measure(
+        lambda: solver.solve(game), trace_memory)
+    expected = ENDGAME_SCORES.get(name)
+    return {
+        "name": name,
+        "empties": len(game.empty_cells),
+        "move": list(move) if move is not None else None,
+        "score": score,
+        "expected": expected,
+        "correct": expected is None or score == expected,
+        "nodes": solver.nodes,
+        "stability_cutoffs": solver.stability_cutoffs,
+        "seconds": round(duration, 6),
+        "nodes_per_second": round(solver.nodes / duration) if duration else None,
+        "peak_memory": peak_memory,
+    }
+
+
+# Imports the engine in a fresh interpreter, prints the time it took and the heavy modules loaded
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import game.player
+print(time.perf_counter() - start)
+print(" ".join(module for module in ("pygame", "numpy", "loguru") if module in sys.modules))
+"""
+
+
+def benchmark_import(repeat=5):
+    """
+    Measure the time to import the engine (rules and search) in a new process, the best of
+    `repeat` runs, and list the heavy modules it imports, none are expected
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.split("\n")
+        timings.append(float(output[0]))
+    return {
+        "seconds": round(min(timings), 6),
+        "heavy_modules": output[1].split(),
+    }
+
+
+def get_commit():
+    """
+    Return the current git commit, or None outside of a repository
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(perft_depth=7, search_depth=4, endgame_depth=None, solve_empties=14, trace_memory=False):
+    """
+    Run the whole suite and return its results as a dictionary
+    """
+    endgame_depth = search_depth if endgame_depth is None else endgame_depth
+    searches = [benchmark_search(name, position, search_depth, trace_memory)
+                for name, position in MIDGAME_POSITIONS.items()]
+    searches += [benchmark_search(name, position, endgame_depth, trace_memory)
+                 for name, position in ENDGAME_POSITIONS.items()]
+    solves = [benchmark_solve(name, position, trace_memory)
+              for name, position in ENDGAME_POSITIONS.items()
+              if 64 - bitboard.count(position[0] | position[1]) <= solve_empties]
+    total_nodes = sum(search["nodes"] for search in searches)
+    total_seconds = sum(search["seconds"] for search in searches)
+    return {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "trace_memory": trace_memory,
+        "import": benchmark_import(),
+        "perft": benchmark_perft(perft_depth, trace_memory),
+        "searches": searches,
+        "total_nodes": total_nodes,
+        "total_seconds": round(total_seconds, 6),
+        "nodes_per_second": round(total_nodes / total_seconds) if total_seconds else None,
+        "solves": solves,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the move generation and the search of the Othello engine")
+    parser.add_argument("--perft-depth", type=int, default=7)
+    parser.add_argument("--search-depth", type=int, default=4)
+    parser.add_argument("--endgame-depth", type=int, default=None,
+                        help="search depth of the endgame positions (default: --search-depth)")
+    parser.add_argument("--solve-empties", type=int, default=14,
+                        help="solve the endgame positions with at most this number of empty cells")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="measure the peak memory of each benchmark, slows down the timings")
+    parser.add_argument("--output", default="-",
+                        help="JSON file to write, - for stdout")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = run(args.perft_depth, args.search_depth,
+                  args.endgame_depth, args.solve_empties, args.trace_memory)
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+    # A wrong perft count means the move generation is broken, a wrong score the solver
+    if not all(result["correct"] for result in results["perft"] + results["solves"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,4 @@ import pygame
 START_HUMAN_VS_HUMAN_EVENT = pygame.USEREVENT + 1
 START_HUMAN_VS_AI_EVENT = pygame.USEREVENT + 2
 GAME_IS_OVER_EVENT = pygame.USEREVENT + 3
+AI_MOVE_EVENT = pygame.USEREVENT + 4
@@ -0,0 +1,245 @@
+"""
+Analysis of many positions at once
+
+    with Analyzer(node_limit=20000) as analyzer:
+        for result in analyzer.analyze(positions):
+            print(result.move, result.score, result.principal_variation)
+
+A position is a tuple (black bitboard, white bitboard, symbol to move) or
+(board string, symbol to move). A board string has 64 characters "B", "W"
+and "-" or "." for the empty cells, the cell (x, y) being the character
+x * 8 + y; spaces and new lines are ignored.
+
+The positions are searched over a process pool and the results are
+yielded in the order of the positions. The results are cached by the key
+of the canonical form of their position (see game.symmetry), so the
+positions repeated in a batch or equivalent by symmetry are only searched
+once.
+"""
+from collections import OrderedDict, deque
+from typing import NamedTuple
+from game import symmetry, zobrist
+from game.bitboard import FULL
+from game.othello import OthelloGame, COLORS
+from game.parallel import create_process_pool
+
+
+class AnalysisResult(NamedTuple):
+    """
+    Result of the search of a position
+    The score is given for the player to move, in hundredths of a disc
+    """
+    index: int
+    black: int
+    white: int
+    symbol: str
+    move: tuple
+    score: int
+    principal_variation: list
+    depth: int
+    nodes: int
+    solved: bool
+    cached: bool
+
+
+def check_symbol(symbol):
+    """
+    Raise ValueError if a symbol is not the symbol of a player
+    """
+    if symbol not in COLORS:
+        raise ValueError(f"Unknown symbol {symbol!r}, expected one of {', '.join(COLORS)}")
+
+
+def parse_board(board, symbol):
+    """
+    Return the (black, white, symbol) position of a board string
+    Raise ValueError if the board or the symbol is not valid
+    """
+    check_symbol(symbol)
+    cells = "".join(board.split())
+    if len(cells) != 64:
+        raise ValueError(f"A board has 64 cells, not {len(cells)}")
+    black = white = 0
+    for square, cell in enumerate(cells):
+        if cell == "B":
+            black |= 1 << square
+        elif cell == "W":
+            white |= 1 << square
+        elif cell not in "-.":
+            raise ValueError(f"Unknown cell {cell!r}")
+    return black, white, symbol
+
+
+def format_board(black, white):
+    """
+    Return the board string of a position, the inverse of parse_board
+    """
+    return "".join("B" if black >> square & 1 else "W" if white >> square & 1 else "-"
+                   for square in range(64))
+
+
+def parse_position(position):
+    """
+    Return the (black, white, symbol) tuple of a position of the analyzer
+    Raise ValueError if the position is not valid
+    """
+    if len(position) == 2:
+        return parse_board(*position)
+    if len(position) != 3:
+        raise ValueError(f"A position has 2 or 3 items, not {len(position)}")
+    black, white, symbol = position
+    black, white = int(black), int(white)
+    check_symbol(symbol)
+    for bitboard in (black, white):
+        if not 0 <= bitboard <= FULL:
+            raise ValueError(f"{bitboard:#x} is not a bitboard")
+    if black & white:
+        raise ValueError(f"Cells {black & white:#x} hold both a black and a white piece")
+    return black, white, symbol
+
+
+def search_position(black, white, symbol, time_limit=None, node_limit=None):
+    """
+    Search a position with a fresh player, it can run in any process
+    Return the best move, its score, the principal variation, the depth, the nodes and
+    whether the game was solved
+    """
+    game = OthelloGame.from_position((black, white), symbol)
+    player = game.current_player
+    stats = player.search(game, time_limit=time_limit, node_limit=node_limit)
+    if stats.move is None:
+        return None, None, [], 0, 0, False
+    principal_variation = player.get_principal_variation(
+        game, stats.move, max(stats.depth_reached, 1))
+    return stats.move, stats.score, principal_variation, stats.depth_reached, stats.nodes, stats.solved
+
+
+class Analyzer:
+    """
+    Search positions over a process pool, with a bounded cache of the results
+    With `max_workers=1`, or if no process can be started, the positions are searched
+    one after another in the current process
+    """
+
+    # Default number of results kept in the cache
+    CACHE_SIZE = 100000
+
+    def __init__(self, time_limit=None, node_limit=20000, max_workers=None, cache_size=CACHE_SIZE):
+        """
+        Initialize the analyzer, the search of each position is bounded by
+        `time_limit` in seconds (Player.TIME_LIMIT by default) and by `node_limit`
+        """
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.cache_size = cache_size
+        # Results by canonical key, from the least to the most recently used
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.max_workers, self.executor = create_process_pool(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the worker processes
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def get_cached(self, key):
+        """
+        Return the cached result of a canonical key or None
+        """
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def store(self, key, result):
+        """
+        Cache the result of a canonical key, forgetting the least recently used one if needed
+        """
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def submit(self, canonical, symbol):
+        """
+        Start the search of a canonical position, return a callable giving its result
+        """
+        black, white = canonical
+        arguments = (black, white, symbol, self.time_limit, self.node_limit)
+        if self.executor is None:
+            result = search_position(*arguments)
+            return lambda: result
+        return self.executor.submit(search_position, *arguments).result
+
+    def analyze(self, positions):
+        """
+        Search an iterable of positions and yield an AnalysisResult for each one, in order
+        The positions are read lazily, a bounded number of searches run at a time
+        """
+        # Searches by canonical key: callable giving the result, number of positions waiting for it
+        running = {}
+        # Positions to yield, with their result if it was cached
+        waiting = deque()
+        window = self.max_workers * 2
+        for index, position in enumerate(positions):
+            black, white, symbol = parse_position(position)
+            canonical, transform = symmetry.canonicalize((black, white))
+            key = zobrist.get_hash(canonical, COLORS[symbol])
+            result = None if key in running else self.get_cached(key)
+            if result is not None:
+                self.cache_hits += 1
+            elif key in running:
+                self.cache_hits += 1
+                running[key][1] += 1
+            else:
+                self.cache_misses += 1
+                running[key] = [self.submit(canonical, symbol), 1]
+            waiting.append((index, black, white, symbol, key, transform, result))
+
+            # Yield the results that are ready, or wait when enough searches are running
+            while waiting and (waiting[0][-1] is not None or len(running) >= window):
+                yield self.get_result(waiting.popleft(), running)
+        while waiting:
+            yield self.get_result(waiting.popleft(), running)
+
+    def get_result(self, item, running):
+        """
+        Wait for the result of a position and map it back to the orientation of the position
+        """
+        index, black, white, symbol, key, transform, result = item
+        cached = result is not None
+        if not cached:
+            search = running[key]
+            result = search[0]()
+            search[1] -= 1
+            if search[1] == 0:
+                del running[key]
+                self.store(key, result)
+
+        move, score, principal_variation, depth, nodes, solved = result
+        if move is not None:
+            move = symmetry.untransform_move(move, transform)
+        principal_variation = [None if variation_move is None else
+                               symmetry.untransform_move(variation_move, transform)
+                               for variation_move in principal_variation]
+        return AnalysisResult(index, black, white, symbol, move, score, principal_variation,
+                              depth, nodes, solved, cached)
+
+
+def analyze(positions, time_limit=None, node_limit=20000, max_workers=None):
+    """
+    Search an iterable of positions with a temporary analyzer, see Analyzer.analyze
+    """
+    with Analyzer(time_limit, node_limit, max_workers) as analyzer:
+        yield from analyzer.analyze(positions)
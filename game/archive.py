@@ -0,0 +1,282 @@
+"""
+Compact binary archive of games
+
+An archive stores the games played from the initial position with one byte
+per move: the square x * 8 + y of the move, or PASS. Each game starts with
+a header giving its players, its final score and its duration:
+
+    magic | game header, moves | game header, moves | ... | index | footer
+
+The index is written when the archive is closed. It holds the names of the
+players and the offset of one game out of BATCH_SIZE, so that any game can
+be found without reading the whole archive. Reading an archive is done one
+game at a time, and the positions of its games are rebuilt on the fly:
+
+    with ArchiveReader("games.archive") as reader:
+        for position in reader.iter_positions():
+            ...
+
+game.selfplay writes archives with `--format archive`.
+"""
+import json
+import struct
+from typing import NamedTuple
+from game import bitboard
+from game.othello import OthelloGame, SYMBOLS, COLORS
+
+MAGIC = b"OTHARC01"
+
+# Byte of a pass in the moves of a game
+PASS = 64
+
+# Number of games between two offsets of the index
+BATCH_SIZE = 4096
+
+# Number of moves, black player, white player (indexes in the names of the index),
+# black score, white score, duration in milliseconds
+GAME_HEADER = struct.Struct("<BHHBBI")
+# Batch size and length of the JSON list of the names of the players
+INDEX_HEADER = struct.Struct("<II")
+# Offset of the index, number of games, magic
+FOOTER = struct.Struct("<QQ8s")
+
+INITIAL_BITBOARDS = tuple(OthelloGame().bitboards)
+
+
+class GameRecord(NamedTuple):
+    """
+    Game read from an archive, its moves are the bytes of the archive
+    """
+    black: str
+    white: str
+    black_score: int
+    white_score: int
+    duration: float
+    moves: bytes
+
+    def get_winner(self):
+        """
+        Return the symbol of the winner or "Tie"
+        """
+        if self.black_score > self.white_score:
+            return "B"
+        if self.black_score < self.white_score:
+            return "W"
+        return "Tie"
+
+    def get_moves(self):
+        """
+        Return the moves as (x, y) cells and None for the passes
+        """
+        return [None if move == PASS else bitboard.position(move) for move in self.moves]
+
+
+class Position(NamedTuple):
+    """
+    Position of a game of an archive, before the move played in it
+    """
+    game: int
+    ply: int
+    black: int
+    white: int
+    symbol: str
+    move: tuple
+
+
+def encode_moves(moves):
+    """
+    Return the bytes of moves given as (x, y) cells and None for the passes
+    """
+    return bytes(PASS if move is None else bitboard.square(*move) for move in moves)
+
+
+def get_result_moves(result):
+    """
+    Return the moves of a game written by game.selfplay, with its passes
+    """
+    moves = []
+    symbol = "B"
+    for move_symbol, x, y in result["moves"]:
+        if move_symbol != symbol:
+            moves.append(None)
+        moves.append((x, y))
+        symbol = "W" if move_symbol == "B" else "B"
+    return moves
+
+
+def replay(moves):
+    """
+    Return a game with the moves played from the initial position,
+    its move history can be undone
+    """
+    game = OthelloGame()
+    game.set_players()
+    game.is_simulated = True
+    for move in moves:
+        game.undo_records.append(game.make_move(move))
+    return game
+
+
+class ArchiveWriter:
+    """
+    Write games to an archive, one at a time
+    The archive is only complete once closed
+    """
+
+    def __init__(self, file):
+        """
+        Open an archive for writing, `file` is a path or a binary file
+        """
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self.owns_file else file
+        self.names = {}
+        self.offsets = []
+        self.games = 0
+        self.offset = 0
+        self.write(MAGIC)
+
+    def write(self, data):
+        self.file.write(data)
+        self.offset += len(data)
+
+    def get_name_index(self, name):
+        if name not in self.names:
+            self.names[name] = len(self.names)
+        return self.names[name]
+
+    def write_game(self, moves, black="", white="", black_score=0, white_score=0, duration=0.0):
+        """
+        Write a game, `moves` are (x, y) cells and None for the passes
+        """
+        if self.games % BATCH_SIZE == 0:
+            self.offsets.append(self.offset)
+        data = encode_moves(moves)
+        self.write(GAME_HEADER.pack(len(data), self.get_name_index(black), self.get_name_index(white),
+                                    black_score, white_score, round(duration * 1000)))
+        self.write(data)
+        self.games += 1
+
+    def write_othello_game(self, game, black="", white="", duration=0.0):
+        """
+        Write the moves played with place_piece in an OthelloGame started from the initial position
+        """
+        self.write_game(game.get_move_history(), black, white, game.get_player_score("B"),
+                        game.get_player_score("W"), duration)
+
+    def write_result(self, result):
+        """
+        Write a game written by game.selfplay
+        """
+        self.write_game(get_result_moves(result), result["black"], result["white"],
+                        result["black_score"], result["white_score"], result["duration"])
+
+    def close(self):
+        """
+        Write the index and the footer
+        """
+        index_offset = self.offset
+        names = json.dumps(list(self.names)).encode()
+        self.write(INDEX_HEADER.pack(BATCH_SIZE, len(names)))
+        self.write(names)
+        self.write(struct.pack(f"<{len(self.offsets)}Q", *self.offsets))
+        self.write(FOOTER.pack(index_offset, self.games, MAGIC))
+        self.file.flush()
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveReader:
+    """
+    Read the games of an archive lazily
+    """
+
+    def __init__(self, path):
+        """
+        Open an archive and read its index
+        """
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an archive of games")
+        self.file.seek(-FOOTER.size, 2)
+        self.index_offset, self.games, magic = FOOTER.unpack(
+            self.file.read(FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a complete archive of games")
+
+        self.file.seek(self.index_offset)
+        self.batch_size, names_length = INDEX_HEADER.unpack(
+            self.file.read(INDEX_HEADER.size))
+        self.names = json.loads(self.file.read(names_length))
+        batches = -(-self.games // self.batch_size)
+        self.offsets = struct.unpack(f"<{batches}Q", self.file.read(8 * batches))
+
+    def __len__(self):
+        return self.games
+
+    def read_game(self):
+        """
+        Read the game at the current offset of the file
+        """
+        length, black, white, black_score, white_score, duration = GAME_HEADER.unpack(
+            self.file.read(GAME_HEADER.size))
+        return GameRecord(self.names[black], self.names[white], black_score, white_score,
+                          duration / 1000, self.file.read(length))
+
+    def iter_games(self, start=0):
+        """
+        Iterate over the games of the archive from the game `start`
+        """
+        if start >= self.games:
+            return
+        batch, skipped = divmod(start, self.batch_size)
+        self.file.seek(self.offsets[batch])
+        for _ in range(skipped):
+            self.read_game()
+        for _ in range(start, self.games):
+            # The file is shared, another iteration may have moved its offset
+            offset = self.file.tell()
+            game = self.read_game()
+            yield game
+            self.file.seek(offset + GAME_HEADER.size + len(game.moves))
+
+    def __iter__(self):
+        return self.iter_games()
+
+    def get_game(self, index):
+        """
+        Return one game of the archive
+        """
+        return next(self.iter_games(index))
+
+    def iter_positions(self, start=0):
+        """
+        Iterate over the positions of the games from the game `start`,
+        the positions are rebuilt from the moves as they are read
+        """
+        for game_index, game in enumerate(self.iter_games(start), start):
+            boards = list(INITIAL_BITBOARDS)
+            color = COLORS["B"]
+            for ply, move in enumerate(game.moves):
+                yield Position(game_index, ply, boards[0], boards[1], SYMBOLS[color],
+                               None if move == PASS else bitboard.position(move))
+                if move != PASS:
+                    own, opponent = boards[color], boards[1 - color]
+                    flips = bitboard.get_flips(own, opponent, move)
+                    boards[color] = own | flips | (1 << move)
+                    boards[1 - color] = opponent ^ flips
+                color = 1 - color
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
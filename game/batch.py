@@ -0,0 +1,283 @@
+"""
+Many games played in lockstep, for rollouts and data generation
+
+    games = BatchGame(10000)
+    rng = np.random.default_rng(0)
+    while not games.done.all():
+        games.step(choose_random_moves(games.moves, rng))
+    black_scores, white_scores = games.get_scores()
+
+The positions of the N games are NumPy uint64 arrays of the black and white
+pieces with the color to move of each game, and every operation works on
+all the games at once with the bitboard primitives of game.bitboard. As in
+OthelloGame.place_piece, a player who cannot move passes automatically and a
+game where neither player can move is done: its legal moves are 0 and the
+move given to it must be PASS.
+
+The games can be checked against OthelloGame and timed with:
+
+    python -m game.batch --games 10000 --check 500
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+from game import bitboard
+from game.evaluation import count
+from game.othello import OthelloGame, COLORS
+
+# Square of a pass, as in game.archive
+PASS = 64
+
+INITIAL_BITBOARDS = tuple(OthelloGame().bitboards)
+
+
+def get_flips(own, opponent, moves):
+    """
+    Return the opponent pieces flipped by one move on each board,
+    `moves` holds the bit of the move of each board or 0
+    """
+    # Opponent pieces that a run moving along y can cross without wrapping around
+    inner = opponent & np.uint64(0x7E7E7E7E7E7E7E7E)
+    flips = np.zeros_like(own)
+    for amount, crossed in ((1, inner), (8, opponent), (7, inner), (9, inner)):
+        # Run from the move along the opponent pieces, it flips them if it ends on our piece
+        run = (moves << amount) & crossed
+        run |= (run << amount) & crossed
+        run |= (run << amount) & crossed
+        run |= (run << amount) & crossed
+        run |= (run << amount) & crossed
+        run |= (run << amount) & crossed
+        flips |= np.where((run << amount) & own != 0, run, 0)
+
+        run = (moves >> amount) & crossed
+        run |= (run >> amount) & crossed
+        run |= (run >> amount) & crossed
+        run |= (run >> amount) & crossed
+        run |= (run >> amount) & crossed
+        run |= (run >> amount) & crossed
+        flips |= np.where((run >> amount) & own != 0, run, 0)
+    return flips
+
+
+def get_squares(moves):
+    """
+    Return the bit of each square of `moves` as a (N, 64) array of booleans
+    """
+    bytes_ = np.ascontiguousarray(moves, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(bytes_, axis=1, bitorder="little").astype(bool)
+
+
+def choose_random_moves(moves, rng):
+    """
+    Return a random square of each bitboard of `moves` or PASS if it is 0
+    `rng` is a NumPy random generator
+    """
+    squares = get_squares(moves)
+    # The chosen move is the n-th set bit, n uniform below the number of moves
+    choices = (rng.random(len(moves)) * count(moves)).astype(np.int64)
+    chosen = np.argmax(np.cumsum(squares, axis=1) > choices[:, None], axis=1)
+    return np.where(moves != 0, chosen, PASS)
+
+
+class BatchGame:
+    """
+    N games advanced together, each from its own position
+    """
+
+    def __init__(self, size=1):
+        """
+        Start `size` games from the initial position
+        """
+        self.set_positions(np.full(size, INITIAL_BITBOARDS[0], dtype=np.uint64),
+                           np.full(size, INITIAL_BITBOARDS[1], dtype=np.uint64),
+                           np.full(size, COLORS["B"], dtype=np.uint8))
+
+    @classmethod
+    def from_positions(cls, black, white, colors):
+        """
+        Create games from arrays of black pieces, white pieces and colors to move
+        """
+        games = cls.__new__(cls)
+        games.set_positions(np.array(black, dtype=np.uint64), np.array(white, dtype=np.uint64),
+                            np.array(colors, dtype=np.uint8))
+        return games
+
+    def set_positions(self, black, white, colors):
+        self.black = black
+        self.white = white
+        self.color = colors
+        self.done = np.zeros(len(black), dtype=bool)
+        self.passes = np.zeros(len(black), dtype=np.int64)
+        self.plies = 0
+        self.moves = bitboard.get_moves(*self.get_own_and_opponent())
+        self.update()
+
+    def __len__(self):
+        return len(self.black)
+
+    def get_own_and_opponent(self):
+        """
+        Return the pieces of the player to move and of his opponent in each game
+        """
+        is_black = self.color == COLORS["B"]
+        return (np.where(is_black, self.black, self.white),
+                np.where(is_black, self.white, self.black))
+
+    def update(self):
+        """
+        Make the players without legal moves pass and mark the games where neither player
+        can move as done
+        """
+        blocked = (self.moves == 0) & ~self.done
+        if not blocked.any():
+            return
+        own, opponent = self.get_own_and_opponent()
+        opponent_moves = bitboard.get_moves(opponent[blocked], own[blocked])
+        passing = np.flatnonzero(blocked)[opponent_moves != 0]
+        self.color[passing] ^= 1
+        self.moves[passing] = opponent_moves[opponent_moves != 0]
+        self.passes[passing] += 1
+        self.done |= blocked
+        self.done[passing] = False
+
+    def step(self, squares):
+        """
+        Play one move in each game, `squares` holds the square x * 8 + y of each move and
+        PASS for the games that are done
+        """
+        squares = np.asarray(squares, dtype=np.int64)
+        if squares.shape != self.black.shape:
+            raise ValueError(f"Expected {len(self)} moves, not {squares.shape}")
+        playing = ~self.done
+        bits = np.where(playing, np.uint64(1) << np.minimum(squares, 63).astype(np.uint64), 0)
+        illegal = playing & ((squares < 0) | (squares >= PASS) | (bits & self.moves == 0))
+        illegal |= self.done & (squares != PASS)
+        if illegal.any():
+            index = int(np.flatnonzero(illegal)[0])
+            raise ValueError(f"Illegal move {int(squares[index])} in game {index}")
+
+        own, opponent = self.get_own_and_opponent()
+        flips = get_flips(own, opponent, bits)
+        own |= flips | bits
+        opponent ^= flips
+        is_black = self.color == COLORS["B"]
+        self.black = np.where(is_black, own, opponent)
+        self.white = np.where(is_black, opponent, own)
+        self.color ^= playing.astype(np.uint8)
+        self.plies += 1
+
+        self.moves = np.where(playing, bitboard.get_moves(opponent, own), 0)
+        self.update()
+
+    def get_scores(self):
+        """
+        Return the number of black pieces and of white pieces of each game
+        """
+        return count(self.black), count(self.white)
+
+    def play_random(self, rng):
+        """
+        Play random moves until every game is done
+        """
+        while not self.done.all():
+            self.step(choose_random_moves(self.moves, rng))
+
+
+def cross_check(games=100, seed=0):
+    """
+    Play random games in a batch and in OthelloGame objects with the same moves,
+    raise an AssertionError at the first difference
+    Return the number of positions compared
+    """
+    rng = np.random.default_rng(seed)
+    batch = BatchGame(games)
+    othello_games = []
+    for _ in range(games):
+        game = OthelloGame()
+        game.set_players()
+        game.is_simulated = True
+        othello_games.append(game)
+
+    compared = 0
+    while True:
+        for index, game in enumerate(othello_games):
+            position = (int(batch.black[index]), int(batch.white[index]), int(batch.color[index]),
+                        int(batch.moves[index]), bool(batch.done[index]))
+            expected = (*game.bitboards, game.color,
+                        0 if game.is_game_over() else game.get_playable_bitboard(),
+                        game.is_game_over())
+            assert position == expected, \
+                f"Game {index} at ply {batch.plies}: batch {position}, OthelloGame {expected}"
+            compared += 1
+        if batch.done.all():
+            return compared
+
+        squares = choose_random_moves(batch.moves, rng)
+        for game, square in zip(othello_games, squares):
+            if square != PASS:
+                game.place_piece(*bitboard.position(int(square)))
+        batch.step(squares)
+
+
+def play_othello_games(games, seed=0):
+    """
+    Play random games one after another with OthelloGame, for comparison
+    """
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = OthelloGame()
+        game.set_players()
+        game.is_simulated = True
+        while not game.is_game_over():
+            x, y = bitboard.position(
+                rng.choice(list(bitboard.iter_squares(game.get_playable_bitboard()))))
+            game.place_piece(x, y)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time random games played in lockstep against OthelloGame")
+    parser.add_argument("--games", type=int, default=10000,
+                        help="number of games of the batch")
+    parser.add_argument("--othello-games", type=int, default=200,
+                        help="number of games played with OthelloGame for comparison")
+    parser.add_argument("--check", type=int, default=0,
+                        help="number of games cross-checked against OthelloGame first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    summary = {}
+    if args.check:
+        summary["checked_positions"] = cross_check(args.check, args.seed)
+
+    batch = BatchGame(args.games)
+    start = time.perf_counter()
+    batch.play_random(np.random.default_rng(args.seed))
+    seconds = time.perf_counter() - start
+    black_scores, white_scores = batch.get_scores()
+    summary["batch"] = {
+        "games": args.games,
+        "plies": batch.plies,
+        "seconds": round(seconds, 3),
+        "games_per_second": round(args.games / seconds, 1),
+        "black_wins": int((black_scores > white_scores).sum()),
+        "white_wins": int((black_scores < white_scores).sum()),
+    }
+
+    if args.othello_games:
+        start = time.perf_counter()
+        play_othello_games(args.othello_games, args.seed)
+        seconds = time.perf_counter() - start
+        summary["othello_game"] = {
+            "games": args.othello_games,
+            "seconds": round(seconds, 3),
+            "games_per_second": round(args.othello_games / seconds, 1),
+        }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Bitboard primitives for the Othello engine
+
+A position is stored as two 64-bit integers, one per color.
+The cell (x, y) of the board is mapped to the bit x * 8 + y.
+"""
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+# Columns masks used to prevent the shifts from wrapping around the board
+NOT_Y0 = 0xFEFEFEFEFEFEFEFE
+NOT_Y7 = 0x7F7F7F7F7F7F7F7F
+
+# Same order as OthelloGame.DIRECTIONS
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1),
+              (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+def _direction_mask(dy):
+    """
+    Return the mask to apply after a shift in a direction
+    """
+    if dy == 1:
+        return NOT_Y0
+    if dy == -1:
+        return NOT_Y7
+    return FULL
+
+
+# (shift, mask) for each direction, a positive shift is a left shift
+SHIFTS = [(dx * 8 + dy, _direction_mask(dy)) for dx, dy in DIRECTIONS]
+
+
+def square(x, y):
+    """
+    Return the bit index of a cell
+    """
+    return x * 8 + y
+
+
+def position(square_index):
+    """
+    Return the (x, y) cell of a bit index
+    """
+    return divmod(square_index, 8)
+
+
+def shift(bitboard, amount, mask):
+    """
+    Shift a bitboard in a direction and remove the bits that wrapped around
+    """
+    if amount > 0:
+        return (bitboard << amount) & mask
+    return (bitboard >> -amount) & mask
+
+
+def iter_squares(bitboard):
+    """
+    Iterate over the bit indexes set in a bitboard
+    """
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+def count(bitboard):
+    """
+    Return the number of bits set in a bitboard
+    """
+    return bitboard.bit_count()
+
+
+def get_moves(own, opponent):
+    """
+    Return the bitboard of the legal moves for the player owning `own`
+    Also works on NumPy uint64 arrays
+    """
+    empty = ~(own | opponent) & FULL
+    # Opponent pieces that a run moving along y can cross without wrapping around
+    inner = opponent & 0x7E7E7E7E7E7E7E7E
+    moves = 0
+    for amount, crossed in ((1, inner), (8, opponent), (7, inner), (9, inner)):
+        # Run along the opponent pieces adjacent to our pieces, in both directions
+        candidates = (own << amount) & crossed
+        candidates |= (candidates << amount) & crossed
+        candidates |= (candidates << amount) & crossed
+        candidates |= (candidates << amount) & crossed
+        candidates |= (candidates << amount) & crossed
+        candidates |= (candidates << amount) & crossed
+        moves |= (candidates << amount) & empty
+
+        candidates = (own >> amount) & crossed
+        candidates |= (candidates >> amount) & crossed
+        candidates |= (candidates >> amount) & crossed
+        candidates |= (candidates >> amount) & crossed
+        candidates |= (candidates >> amount) & crossed
+        candidates |= (candidates >> amount) & crossed
+        moves |= (candidates >> amount) & empty
+    return moves
+
+
+def get_flips_in_direction(own, opponent, square_index, amount, mask):
+    """
+    Return the opponent pieces flipped in one direction by a move
+    """
+    flips = 0
+    cursor = shift(1 << square_index, amount, mask)
+    while cursor & opponent:
+        flips |= cursor
+        cursor = shift(cursor, amount, mask)
+    return flips if cursor & own else 0
+
+
+def get_flips(own, opponent, square_index):
+    """
+    Return the opponent pieces flipped by a move, in all directions
+    """
+    flips = 0
+    for amount, mask in SHIFTS:
+        flips |= get_flips_in_direction(
+            own, opponent, square_index, amount, mask)
+    return flips
+
+
+def flip_vertical(bitboard):
+    """
+    Mirror a bitboard along x, the cell (x, y) goes to (7 - x, y)
+    Also works on NumPy uint64 arrays
+    """
+    bitboard = ((bitboard >> 8) & 0x00FF00FF00FF00FF) | (
+        (bitboard & 0x00FF00FF00FF00FF) << 8)
+    bitboard = ((bitboard >> 16) & 0x0000FFFF0000FFFF) | (
+        (bitboard & 0x0000FFFF0000FFFF) << 16)
+    return (bitboard >> 32) | ((bitboard << 32) & FULL)
+
+
+def flip_horizontal(bitboard):
+    """
+    Mirror a bitboard along y, the cell (x, y) goes to (x, 7 - y)
+    Also works on NumPy uint64 arrays
+    """
+    bitboard = ((bitboard >> 1) & 0x5555555555555555) | (
+        (bitboard & 0x5555555555555555) << 1)
+    bitboard = ((bitboard >> 2) & 0x3333333333333333) | (
+        (bitboard & 0x3333333333333333) << 2)
+    return ((bitboard >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bitboard & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def transpose(bitboard):
+    """
+    Mirror a bitboard along its diagonal, the cell (x, y) goes to (y, x)
+    Also works on NumPy uint64 arrays
+    """
+    swap = 0x0F0F0F0F00000000 & (bitboard ^ (bitboard << 28))
+    bitboard = bitboard ^ swap ^ (swap >> 28)
+    swap = 0x3333000033330000 & (bitboard ^ (bitboard << 14))
+    bitboard = bitboard ^ swap ^ (swap >> 14)
+    swap = 0x5500550055005500 & (bitboard ^ (bitboard << 7))
+    bitboard = bitboard ^ swap ^ (swap >> 7)
+    return bitboard
@@ -0,0 +1,218 @@
+"""
+Opening book of the AI
+
+The book maps positions to a move searched in advance. Positions that are
+rotations or reflections of each other share one entry: a position is
+stored under the Zobrist hash of its canonical form (see game.symmetry)
+and its move is stored in the canonical orientation.
+
+A book file is the magic bytes followed by the entries sorted by key, it is
+memory-mapped and searched by bisection so opening it costs the same for
+any size of book. Build a book from the results of game.selfplay with:
+
+    python -m game.selfplay --games 500 --black random --white random --output games.jsonl
+    python -m game.book games.jsonl --nodes 20000
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from loguru import logger
+from game import bitboard, symmetry, zobrist
+from game.othello import OthelloGame, COLORS
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "assets", "book", "opening.book")
+
+MAGIC = b"OTHBOOK1"
+
+# One entry of a book file: canonical position key, move in the canonical
+# orientation, depth and score of its search and number of games that reached it
+ENTRY = np.dtype([("key", "<u8"), ("square", "u1"), ("depth", "u1"),
+                  ("score", "<i2"), ("games", "<u4")])
+
+
+def get_canonical_key(bitboards, symbol):
+    """
+    Return the book key of a position and the transform that maps it to its canonical form
+    """
+    canonical, transform = symmetry.canonicalize(bitboards)
+    return zobrist.get_hash(canonical, COLORS[symbol]), transform
+
+
+class OpeningBook:
+    """
+    Read-only book file, memory-mapped
+    """
+
+    def __init__(self, path=BOOK_PATH):
+        """
+        Open a book file
+        """
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an opening book")
+        if os.path.getsize(path) > len(MAGIC):
+            self.entries = np.memmap(path, dtype=ENTRY, mode="r", offset=len(MAGIC))
+        else:
+            self.entries = np.zeros(0, dtype=ENTRY)
+        self.keys = self.entries["key"]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_entry(self, bitboards, symbol):
+        """
+        Return the entry of a position and the symmetry mapping the position
+        to the orientation of the entry, or (None, None)
+        """
+        key, transform = get_canonical_key(bitboards, symbol)
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index < len(self.keys) and int(self.keys[index]) == key:
+            return self.entries[index], transform
+        return None, None
+
+    def get_move(self, game):
+        """
+        Return the book move of the current player of a game, or None
+        """
+        entry, transform = self.get_entry(game.bitboards, game.current_player.symbol)
+        if entry is None:
+            return None
+        move = symmetry.untransform_move(
+            bitboard.position(int(entry["square"])), transform)
+        # A key collision could give a move that is not legal here
+        if not game.get_playable_bitboard() >> bitboard.square(*move) & 1:
+            return None
+        return move
+
+
+_default_book = None
+
+
+def get_default_book():
+    """
+    Return the book of BOOK_PATH, opened on first use, or None if there is no book
+    """
+    global _default_book
+    if _default_book is None and os.path.exists(BOOK_PATH):
+        _default_book = OpeningBook()
+    return _default_book
+
+
+class BookBuilder:
+    """
+    Grow a book from the results of self-play games
+
+    The games choose the positions worth storing: every position reached
+    in the first `max_plies` moves of at least `min_games` games. Each of
+    them is then searched by a fresh AI to choose its move and score.
+    """
+
+    def __init__(self, max_plies=12, min_games=2):
+        self.max_plies = max_plies
+        self.min_games = min_games
+        # Canonical position (black, white, symbol) by key and the number of games that reached it
+        self.positions = {}
+        self.games = {}
+
+    def add_game(self, result):
+        """
+        Count the opening positions of a game, a result written by game.selfplay
+        """
+        game = OthelloGame()
+        game.set_players()
+        game.is_simulated = True
+        for symbol, x, y in result["moves"][:self.max_plies]:
+            if game.current_player.symbol != symbol:
+                game.make_move(None)
+            key, transform = game.get_canonical_hash()
+            if key not in self.positions:
+                black, white = game.bitboards
+                self.positions[key] = (symmetry.transform(black, transform),
+                                       symmetry.transform(white, transform), symbol)
+            self.games[key] = self.games.get(key, 0) + 1
+            game.make_move((x, y))
+
+    def add_games(self, results):
+        for result in results:
+            self.add_game(result)
+
+    def build(self, time_limit=None, node_limit=20000, entries=None):
+        """
+        Search the positions reached by enough games and return the entries of the book
+        `entries` are the entries of an existing book, kept unless their position is searched again
+        """
+        book = {}
+        if entries is not None:
+            for entry in entries:
+                book[int(entry["key"])] = entry.item()
+
+        selected = [key for key, games in self.games.items()
+                    if games >= self.min_games]
+        for index, key in enumerate(selected):
+            black, white, symbol = self.positions[key]
+            game = OthelloGame.from_position((black, white), symbol)
+            if not game.get_playable_bitboard():
+                continue
+            stats = game.current_player.search(
+                game, time_limit=time_limit, node_limit=node_limit)
+            x, y = stats.move
+            score = stats.score if stats.score is not None else 0
+            book[key] = (key, bitboard.square(x, y), stats.depth_reached,
+                         score, self.games[key])
+            logger.info("Searched book position {}/{}: {} scores {}",
+                        index + 1, len(selected), stats.move, score)
+
+        return np.array(sorted(book.values()), dtype=ENTRY)
+
+
+def write_book(entries, path=BOOK_PATH):
+    """
+    Write the entries of a book, sorted by key
+    """
+    entries = np.sort(np.asarray(entries, dtype=ENTRY), order="key")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(entries.tobytes())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build or extend the opening book from self-play results")
+    parser.add_argument("games", nargs="+",
+                        help="JSONL files written by game.selfplay")
+    parser.add_argument("--plies", type=int, default=12,
+                        help="number of opening moves of each game to consider")
+    parser.add_argument("--min-games", type=int, default=2,
+                        help="minimum number of games reaching a position to store it")
+    parser.add_argument("--time", type=float, default=None,
+                        help="time limit of the search of a position in seconds")
+    parser.add_argument("--nodes", type=int, default=20000,
+                        help="node limit of the search of a position")
+    parser.add_argument("--output", default=BOOK_PATH)
+    parser.add_argument("--extend", action="store_true",
+                        help="keep the entries of the existing book at --output")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    builder = BookBuilder(args.plies, args.min_games)
+    for path in args.games:
+        with open(path) as file:
+            builder.add_games(json.loads(line) for line in file if line.strip())
+
+    entries = None
+    if args.extend and os.path.exists(args.output):
+        entries = OpeningBook(args.output).entries
+    entries = builder.build(args.time, args.nodes, entries)
+    write_book(entries, args.output)
+    logger.info("Wrote {} positions to {}", len(entries), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Test clients of the match server, see game.server
+
+    python -m game.client --clients 50 --games 4 --opponent ai
+    python -m game.client --local --workers 4 --clients 50 --games 4
+
+Every client opens its own connection and plays its games one after
+another with random moves against the opponent chosen. With `--local` a
+server is started in this process on a free port. The summary of the run
+and the metrics of the server are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from game.log import logger
+from game import bitboard
+from game.analysis import parse_board
+from game.othello import COLORS
+from game.server import MatchServer, SearchPool, PLAYER_KINDS, CLOCK
+
+
+class MatchClient:
+    """
+    Connection to a match server, the lines received are dispatched to the games by id
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        # Lines of each game, and of the replies that are not about a game
+        self.games = {}
+        self.replies = asyncio.Queue()
+        self.task = asyncio.create_task(self.read())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            words = line.decode().split()
+            if len(words) > 1 and words[0] in ("TURN", "MOVE", "PASS", "OVER"):
+                # The lines of a game can arrive before the reply that started it is read
+                self.games.setdefault(int(words[1]), asyncio.Queue()).put_nowait(words)
+            else:
+                self.replies.put_nowait(words)
+
+    async def send(self, *words):
+        self.writer.write((" ".join(str(word) for word in words) + "\n").encode())
+        await self.writer.drain()
+
+    async def request(self, *words):
+        """
+        Send a command and return the words of its reply
+        """
+        await self.send(*words)
+        return await self.replies.get()
+
+    async def play_game(self, opponent="ai", clock=CLOCK, rng=random):
+        """
+        Play a game against an opponent of the server with random moves, the client
+        plays black or white at random
+        Return the words of the OVER line of the game
+        """
+        kinds = ["client", opponent]
+        rng.shuffle(kinds)
+        reply = await self.request("NEW", *kinds, clock)
+        if reply[0] != "GAME":
+            raise RuntimeError(" ".join(reply))
+        game_id = int(reply[1])
+        lines = self.games.setdefault(game_id, asyncio.Queue())
+        try:
+            while True:
+                words = await lines.get()
+                if words[0] == "OVER":
+                    return words
+                if words[0] == "TURN":
+                    black, white, _ = parse_board(words[3], words[2])
+                    bitboards = (black, white)
+                    color = COLORS[words[2]]
+                    moves = bitboard.get_moves(
+                        bitboards[color], bitboards[1 - color])
+                    x, y = bitboard.position(
+                        rng.choice(list(bitboard.iter_squares(moves))))
+                    await self.send("MOVE", game_id, x, y)
+        finally:
+            del self.games[game_id]
+
+    async def close(self):
+        """
+        Quit and wait for the server to close the connection
+        """
+        await self.send("QUIT")
+        await self.task
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run_client(index, host, port, path, games, opponent, clock, seed):
+    """
+    Play the games of one client, return the seconds each game took
+    """
+    rng = random.Random(seed + index)
+    client = await MatchClient.connect(host, port, path)
+    durations = []
+    try:
+        for _ in range(games):
+            start = time.perf_counter()
+            await client.play_game(opponent, clock, rng)
+            durations.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+    return durations
+
+
+async def load_test(host="127.0.0.1", port=8765, path=None, clients=10, games=1,
+                    opponent="ai", clock=CLOCK, seed=0):
+    """
+    Play games from many concurrent clients and return a summary of the run
+    with the metrics of the server
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_client(index, host, port, path, games, opponent,
+                                                clock, seed)
+                                      for index in range(clients)))
+    seconds = time.perf_counter() - start
+    durations = sorted(duration for result in results for duration in result)
+
+    client = await MatchClient.connect(host, port, path)
+    reply = await client.request("STATS")
+    await client.close()
+    return {
+        "clients": clients,
+        "games": len(durations),
+        "seconds": round(seconds, 3),
+        "games_per_second": round(len(durations) / seconds, 3),
+        "mean_game_seconds": round(sum(durations) / len(durations), 6) if durations else 0.0,
+        "server": json.loads(reply[1]),
+    }
+
+
+async def run_local(workers, node_limit, **arguments):
+    """
+    Run a load test against a server started in this process on a free port
+    """
+    pool = SearchPool(workers)
+    server = MatchServer(pool, arguments["clock"], node_limit)
+    try:
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return await load_test("127.0.0.1", port, **arguments)
+    finally:
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load-test a match server with concurrent clients playing random moves")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None,
+                        help="path of the Unix socket of the server")
+    parser.add_argument("--clients", type=int, default=10,
+                        help="number of concurrent connections")
+    parser.add_argument("--games", type=int, default=1,
+                        help="number of games played by each client")
+    parser.add_argument("--opponent", choices=PLAYER_KINDS[:2], default="ai")
+    parser.add_argument("--clock", type=float, default=CLOCK,
+                        help="clock of a move in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--local", action="store_true",
+                        help="start a server in this process instead of connecting to one")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of search processes of the local server")
+    parser.add_argument("--nodes", type=int, default=None,
+                        help="node limit of an AI move of the local server")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    arguments = dict(clients=args.clients, games=args.games, opponent=args.opponent,
+                     clock=args.clock, seed=args.seed)
+    if args.local:
+        summary = asyncio.run(run_local(args.workers, args.nodes, **arguments))
+    else:
+        summary = asyncio.run(load_test(args.host, args.port, args.unix, **arguments))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Exact solver of the end of the game
+
+When only a few cells are empty the whole game can be searched. The solver
+works directly on the bitboards and on the list of the empty squares, which
+is updated in place when a move is played and undone.
+"""
+from game import bitboard
+from game.evaluation import get_stable
+
+# Quadrant of each square, a bit of the parity mask
+QUADRANTS = [1 << ((square // 8 >= 4) * 2 + (square % 8 >= 4))
+             for square in range(64)]
+
+
+def _neighbours(square):
+    """
+    Return the bitboard of the squares adjacent to a square
+    """
+    x, y = bitboard.position(square)
+    mask = 0
+    for dx, dy in bitboard.DIRECTIONS:
+        if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+            mask |= 1 << bitboard.square(x + dx, y + dy)
+    return mask
+
+
+# A move is only possible next to an opponent piece
+NEIGHBOURS = [_neighbours(square) for square in range(64)]
+
+
+class EndgameSolver:
+    """
+    Alpha-beta search of the exact final disc difference
+
+    Moves are ordered fastest-first (fewest replies for the opponent) when
+    many cells are empty, and by parity (empty cells alone in their quadrant
+    first) near the end. The last three empty cells have dedicated routines.
+    A position fails low without being searched when the stable pieces of the
+    opponent leave no score above alpha.
+    """
+
+    # Minimum number of empty cells to order the moves by the opponent mobility
+    FASTEST_FIRST_EMPTIES = 7
+    # Minimum number of empty cells to look for a stability cutoff, closer to the end
+    # the subtrees are too small to pay for the stable pieces
+    STABILITY_EMPTIES = 6
+
+    def __init__(self, player=None):
+        """
+        Initialize the solver, `player` counts its nodes and enforces its search budget
+        """
+        self.player = player
+        self.nodes = 0
+        self.stability_cutoffs = 0
+
+    def count_node(self):
+        """
+        Count a searched node, the player may stop the search
+        """
+        self.nodes += 1
+        if self.player is not None:
+            self.player.check_budget()
+
+    def solve(self, game, first_move=None):
+        """
+        Return the best move of the current player of a game and the exact final
+        disc difference it leads to for this player
+        """
+        own, opponent = game.get_own_and_opponent()
+        empties = sorted(bitboard.square(x, y) for x, y in game.empty_cells)
+        parity = 0
+        for square in empties:
+            parity ^= QUADRANTS[square]
+
+        moves = self.get_ordered_moves(own, opponent, empties, parity)
+        if not moves:
+            return None, self.search(own, opponent, empties, parity, -64, 64)
+
+        # Try the move of a previous search first
+        first_square = None if first_move is None else bitboard.square(
+            *first_move)
+        moves.sort(key=lambda move: move[1] != first_square)
+
+        best_square, alpha = None, -65
+        for index, square, flips in moves:
+            del empties[index]
+            score = -self.search(opponent ^ flips, own | flips | (1 << square),
+                                 empties, parity ^ QUADRANTS[square], -64, -alpha)
+            empties.insert(index, square)
+            if score > alpha:
+                best_square, alpha = square, score
+        return bitboard.position(best_square), alpha
+
+    def get_ordered_moves(self, own, opponent, empties, parity):
+        """
+        Return the moves of the player owning `own` as tuples (index in empties, square, flips)
+        sorted from the most to the least promising
+        """
+        moves = []
+        for index, square in enumerate(empties):
+            if NEIGHBOURS[square] & opponent:
+                flips = bitboard.get_flips(own, opponent, square)
+                if flips:
+                    moves.append((index, square, flips))
+
+        if len(empties) >= EndgameSolver.FASTEST_FIRST_EMPTIES:
+            # Fastest first: leave as few moves as possible to the opponent
+            def mobility(move):
+                _, square, flips = move
+                return bitboard.count(bitboard.get_moves(opponent ^ flips, own | flips | (1 << square)))
+            moves.sort(key=mobility)
+        else:
+            # Parity: play in the quadrants with an odd number of empty cells first
+            moves.sort(key=lambda move: not parity & QUADRANTS[move[1]])
+        return moves
+
+    def search(self, own, opponent, empties, parity, alpha, beta):
+        """
+        Return the exact final disc difference for the player owning `own`,
+        or a bound of it outside of the window ]alpha, beta[
+        """
+        remaining = len(empties)
+        if remaining <= 3:
+            if remaining == 3:
+                return self.solve_3(own, opponent, empties, parity, alpha, beta)
+            if remaining == 2:
+                return self.solve_2(own, opponent, empties[0], empties[1], alpha, beta)
+            if remaining == 1:
+                return self.solve_1(own, opponent, empties[0])
+            return bitboard.count(own) - bitboard.count(opponent)
+
+        self.count_node()
+        # The opponent keeps his stable pieces, see Player.negamax
+        if remaining >= EndgameSolver.STABILITY_EMPTIES and 64 - 2 * bitboard.count(opponent) <= alpha:
+            bound = 64 - 2 * bitboard.count(get_stable(opponent, own))
+            if bound <= alpha:
+                self.stability_cutoffs += 1
+                return bound
+
+        moves = self.get_ordered_moves(own, opponent, empties, parity)
+        if not moves:
+            # If nobody can play, the game is over
+            if not bitboard.get_moves(opponent, own):
+                return bitboard.count(own) - bitboard.count(opponent)
+            return -self.search(opponent, own, empties, parity, -beta, -alpha)
+
+        best_score = -65
+        for index, square, flips in moves:
+            del empties[index]
+            score = -self.search(opponent ^ flips, own | flips | (1 << square),
+                                 empties, parity ^ QUADRANTS[square], -beta, -alpha)
+            empties.insert(index, square)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def solve_3(self, own, opponent, empties, parity, alpha, beta):
+        """
+        Search the last three empty cells, the cells alone in their quadrant first
+        """
+        self.count_node()
+        squares = sorted(empties, key=lambda square: not parity & QUADRANTS[square])
+
+        best_score = -65
+        for index, square in enumerate(squares):
+            if not NEIGHBOURS[square] & opponent:
+                continue
+            flips = bitboard.get_flips(own, opponent, square)
+            if not flips:
+                continue
+            first, second = squares[:index] + squares[index + 1:]
+            score = -self.solve_2(opponent ^ flips, own | flips | (1 << square),
+                                  first, second, -beta, -alpha)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        return best_score
+
+        if best_score == -65:
+            # If nobody can play, the game is over
+            if not bitboard.get_moves(opponent, own):
+                return bitboard.count(own) - bitboard.count(opponent)
+            return -self.solve_3(opponent, own, empties, parity, -beta, -alpha)
+        return best_score
+
+    def solve_2(self, own, opponent, first, second, alpha, beta, passed=False):
+        """
+        Search the last two empty cells
+        """
+        self.count_node()
+        best_score = -65
+        for square, other in ((first, second), (second, first)):
+            if not NEIGHBOURS[square] & opponent:
+                continue
+            flips = bitboard.get_flips(own, opponent, square)
+            if not flips:
+                continue
+            score = -self.solve_1(opponent ^ flips,
+                                  own | flips | (1 << square), other)
+            if score > best_score:
+                best_score = score
+                if score >= beta:
+                    return best_score
+
+        if best_score == -65:
+            # If nobody can play, the game is over
+            if passed:
+                return bitboard.count(own) - bitboard.count(opponent)
+            return -self.solve_2(opponent, own, first, second, -beta, -alpha, True)
+        return best_score
+
+    def solve_1(self, own, opponent, square):
+        """
+        Return the final disc difference when only one cell is empty
+        """
+        flips = bitboard.get_flips(own, opponent, square)
+        if flips:
+            flipped = bitboard.count(flips)
+            return bitboard.count(own) - bitboard.count(opponent) + 2 * flipped + 1
+        flips = bitboard.get_flips(opponent, own, square)
+        if flips:
+            flipped = bitboard.count(flips)
+            return bitboard.count(own) - bitboard.count(opponent) - 2 * flipped - 1
+        return bitboard.count(own) - bitboard.count(opponent)
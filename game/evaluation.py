@@ -0,0 +1,334 @@
+"""
+Static evaluation of the Othello positions
+
+A position is scored for the player owning `own` with pattern tables
+(the 4 edges and the 3x3 regions of the 4 corners) and with the mobility,
+potential mobility and stability of both players. The scores are in
+hundredths of a disc, see DISC_SCORE.
+
+The weights are read from assets/weights/evaluation.npz, which can be
+rebuilt with `python -m game.evaluation`. NumPy is only imported when the
+weights are loaded or when NumPy arrays are evaluated, so that the rules
+and the search can be imported quickly.
+"""
+import os
+from game import bitboard
+
+# Score of one disc of final difference
+DISC_SCORE = 100
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "assets", "weights", "evaluation.npz")
+
+# TERNARY[mask] is the base 3 number whose digits are the bits of mask,
+# the index of a pattern is TERNARY[own bits] + 2 * TERNARY[opponent bits]
+TERNARY = [sum(3 ** i for i in range(9) if mask >> i & 1) for mask in range(512)]
+
+EDGE_SIZE = 3 ** 8
+CORNER_SIZE = 3 ** 9
+
+# Squares of the borders of the board
+BORDER = 0xFF818181818181FF
+
+
+def _lines(key):
+    """
+    Return the masks of the lines of the board grouping the cells by key(x, y)
+    """
+    lines = {}
+    for x in range(8):
+        for y in range(8):
+            lines[key(x, y)] = lines.get(key(x, y), 0) | (
+                1 << bitboard.square(x, y))
+    return list(lines.values())
+
+
+# For each axis: its two directions as (shift, mask), the cells where the axis
+# leaves the board and the lines of the axis
+AXES = [
+    (bitboard.SHIFTS[2], bitboard.SHIFTS[6], 0x8181818181818181,
+     _lines(lambda x, y: x)),
+    (bitboard.SHIFTS[0], bitboard.SHIFTS[4], 0xFF000000000000FF,
+     _lines(lambda x, y: y)),
+    (bitboard.SHIFTS[1], bitboard.SHIFTS[5], BORDER,
+     _lines(lambda x, y: x - y)),
+    (bitboard.SHIFTS[3], bitboard.SHIFTS[7], BORDER,
+     _lines(lambda x, y: x + y)),
+]
+
+# For each axis: its left shift and its right shift, as positive amounts with their masks
+AXIS_SHIFTS = [(left, left_mask, -right, right_mask)
+               for (left, left_mask), (right, right_mask) in
+               (sorted(directions, reverse=True) for *directions, _, _ in AXES)]
+
+
+def count(bitboards):
+    """
+    Return the number of bits set in a bitboard or in each bitboard of a NumPy array
+    """
+    if not isinstance(bitboards, int):
+        import numpy as np
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(bitboards).astype(np.int64)
+        # NumPy < 2.0
+        bits = np.unpackbits(bitboards.view(np.uint8).reshape(-1, 8), axis=1)
+        return bits.sum(axis=1, dtype=np.int64).reshape(bitboards.shape)
+    return bitboards.bit_count()
+
+
+def get_neighbours(bitboards):
+    """
+    Return the cells adjacent to the pieces of a bitboard
+    """
+    row = bitboards | ((bitboards << 1) & bitboard.NOT_Y0) | (
+        (bitboards >> 1) & bitboard.NOT_Y7)
+    return (row | (row << 8) | (row >> 8)) & bitboard.FULL
+
+
+def get_potential_mobility(own, opponent):
+    """
+    Return the number of empty cells next to an opponent piece
+    """
+    return count(get_neighbours(opponent) & ~(own | opponent) & bitboard.FULL)
+
+
+def get_safe_axes(occupied):
+    """
+    For each of the 4 axes, return the cells whose line along the axis is full
+    or that are on the border where the axis leaves the board
+    """
+    is_array = not isinstance(occupied, int)
+    if is_array:
+        import numpy as np
+    safe_axes = []
+    for _, _, border, lines in AXES:
+        full = 0
+        for line in lines:
+            if is_array:
+                full = full | np.where(
+                    (occupied & line) == line, np.uint64(line), np.uint64(0))
+            elif occupied & line == line:
+                full |= line
+        safe_axes.append(full | border)
+    return safe_axes
+
+
+def get_stable(own, opponent, safe_axes=None, stable=0):
+    """
+    Return the bitboard of the pieces of `own` that can never be flipped
+    A piece is stable if, along each of the 4 axes, its line is full or it
+    touches the border or a stable piece of its color
+    `stable` are pieces of `own` already known to be stable, such as the stable
+    pieces of a previous position of the game
+    """
+    if safe_axes is None:
+        safe_axes = get_safe_axes(own | opponent)
+    is_array = not isinstance(own, int)
+
+    stable = own & stable
+    while True:
+        if is_array or stable:
+            new_stable = own
+            for (left, left_mask, right, right_mask), safe in zip(AXIS_SHIFTS, safe_axes):
+                new_stable = new_stable & (safe | ((stable << left) & left_mask) |
+                                           ((stable >> right) & right_mask))
+        else:
+            # Without a stable piece to lean on, a piece needs its 4 axes to be safe
+            new_stable = own & safe_axes[0] & safe_axes[1] & safe_axes[2] & safe_axes[3]
+        if (new_stable == stable).all() if is_array else new_stable == stable:
+            return stable
+        stable = new_stable
+
+
+def get_pattern_indexes(own, opponent, ternary=TERNARY):
+    """
+    Return the indexes of the 4 edge patterns and of the 4 corner patterns
+    The boards are mirrored so that every corner is seen as the cell (0, 0)
+    """
+    edges = []
+    corners = []
+    orientations = [(own, opponent)]
+    for transform in (bitboard.flip_horizontal, bitboard.flip_vertical):
+        orientations += [(transform(own_board), transform(opponent_board))
+                         for own_board, opponent_board in orientations]
+    for own_board, opponent_board in orientations:
+        # Cells (0..2, 0..2) gathered in 9 bits
+        own_corner = (own_board & 7) | ((own_board >> 5) & 0x38) | (
+            (own_board >> 10) & 0x1C0)
+        opponent_corner = (opponent_board & 7) | ((opponent_board >> 5) & 0x38) | (
+            (opponent_board >> 10) & 0x1C0)
+        corners.append(ternary[own_corner] + 2 * ternary[opponent_corner])
+
+    # The edges x = 0 and x = 7 are rows, the edges y = 0 and y = 7 are rows once transposed
+    for own_board, opponent_board in (orientations[0], orientations[2]):
+        edges.append(ternary[own_board & 0xFF] + 2 *
+                     ternary[opponent_board & 0xFF])
+    for own_board, opponent_board in (orientations[0], orientations[1]):
+        own_board, opponent_board = bitboard.transpose(
+            own_board), bitboard.transpose(opponent_board)
+        edges.append(ternary[own_board & 0xFF] + 2 *
+                     ternary[opponent_board & 0xFF])
+    return edges, corners
+
+
+class Evaluator:
+    """
+    Evaluation function with its weights
+    """
+
+    def __init__(self, path=WEIGHTS_PATH):
+        """
+        Load the weights of an .npz file
+        """
+        import numpy as np
+        with np.load(path) as weights:
+            self.edge_array = weights["edge"].astype(np.int64)
+            self.corner_array = weights["corner"].astype(np.int64)
+            self.mobility_weight, self.potential_mobility_weight, self.stability_weight = (
+                int(weight) for weight in weights["features"])
+        # Python lists are faster than arrays to index one position at a time
+        self.edge_table = self.edge_array.tolist()
+        self.corner_table = self.corner_array.tolist()
+        self.ternary_array = np.array(TERNARY, dtype=np.int64)
+
+    def evaluate(self, own, opponent, own_moves=None, opponent_moves=None, stable=None,
+                 frontier=None):
+        """
+        Return the score of a position for the player owning `own`
+        The legal moves of both players, the stable pieces and the frontier pieces of both
+        colors (see OthelloGame.get_stable_bitboard and get_frontier_bitboard) are computed
+        if they are not given
+        """
+        if own_moves is None:
+            own_moves = bitboard.get_moves(own, opponent)
+        if opponent_moves is None:
+            opponent_moves = bitboard.get_moves(opponent, own)
+        edges, corners = get_pattern_indexes(own, opponent)
+        edge_table, corner_table = self.edge_table, self.corner_table
+        score = (edge_table[edges[0]] + edge_table[edges[1]] + edge_table[edges[2]] + edge_table[edges[3]] +
+                 corner_table[corners[0]] + corner_table[corners[1]] +
+                 corner_table[corners[2]] + corner_table[corners[3]])
+        score += self.mobility_weight * \
+            (bitboard.count(own_moves) - bitboard.count(opponent_moves))
+        if frontier is None:
+            score += self.potential_mobility_weight * (get_potential_mobility(own, opponent) -
+                                                       get_potential_mobility(opponent, own))
+        else:
+            # Only the frontier pieces have empty neighbours
+            empty = ~(own | opponent) & bitboard.FULL
+            score += self.potential_mobility_weight * (
+                bitboard.count(get_neighbours(opponent & frontier) & empty) -
+                bitboard.count(get_neighbours(own & frontier) & empty))
+        if stable is None:
+            safe_axes = get_safe_axes(own | opponent)
+            own_stable = get_stable(own, opponent, safe_axes)
+            opponent_stable = get_stable(opponent, own, safe_axes)
+        else:
+            own_stable, opponent_stable = own & stable, opponent & stable
+        score += self.stability_weight * (bitboard.count(own_stable) -
+                                          bitboard.count(opponent_stable))
+        return score
+
+    def evaluate_batch(self, own, opponent):
+        """
+        Return the scores of many positions at once
+        `own` and `opponent` are NumPy uint64 arrays, one item per position
+        """
+        import numpy as np
+        own = np.asarray(own, dtype=np.uint64)
+        opponent = np.asarray(opponent, dtype=np.uint64)
+        edges, corners = get_pattern_indexes(own, opponent, self.ternary_array)
+        score = self.edge_array[np.stack(edges)].sum(axis=0) + \
+            self.corner_array[np.stack(corners)].sum(axis=0)
+        score += self.mobility_weight * (count(bitboard.get_moves(own, opponent)) -
+                                         count(bitboard.get_moves(opponent, own)))
+        score += self.potential_mobility_weight * (get_potential_mobility(own, opponent) -
+                                                   get_potential_mobility(opponent, own))
+        safe_axes = get_safe_axes(own | opponent)
+        score += self.stability_weight * (count(get_stable(own, opponent, safe_axes)) -
+                                          count(get_stable(opponent, own, safe_axes)))
+        return score
+
+
+_default_evaluator = None
+
+
+def get_default_evaluator():
+    """
+    Return the evaluator using the weights of WEIGHTS_PATH, loaded on first use
+    """
+    global _default_evaluator
+    if _default_evaluator is None:
+        _default_evaluator = Evaluator()
+    return _default_evaluator
+
+
+def _digits(index, length):
+    """
+    Return the base 3 digits of a pattern index: 0 empty, 1 own, 2 opponent
+    """
+    digits = []
+    for _ in range(length):
+        index, digit = divmod(index, 3)
+        digits.append(digit)
+    return digits
+
+
+def _edge_value(cells):
+    """
+    Hand-tuned value of an edge, the corners are scored by the corner patterns
+    """
+    square_values = [0, -5, 10, 5, 5, 10, -5, 0]
+    value = 0
+    for index, cell in enumerate(cells):
+        if cell:
+            value += square_values[index] if cell == 1 else - \
+                square_values[index]
+
+    for corner, c_square, step in ((0, 1, 1), (7, 6, -1)):
+        # A piece next to an empty corner gives the corner away
+        if cells[corner] == 0 and cells[c_square]:
+            value += -30 if cells[c_square] == 1 else 30
+        # The pieces continuing an occupied corner cannot be flipped
+        color = cells[corner]
+        index = corner + step
+        while color and 0 <= index < 8 and cells[index] == color:
+            value += 15 if color == 1 else -15
+            index += step
+    return value
+
+
+def _corner_value(cells):
+    """
+    Hand-tuned value of a 3x3 corner region, the cells are ordered by row
+    The cells shared with the edges are scored by the edge patterns
+    """
+    sign = {0: 0, 1: 1, 2: -1}
+    corner, x_square = cells[0], cells[4]
+    value = 350 * sign[corner]
+    if corner == 0:
+        value -= 200 * sign[x_square]
+        value -= 10 * (sign[cells[5]] + sign[cells[7]])
+    else:
+        value += 10 * sign[x_square]
+    value += 5 * sign[cells[8]]
+    return value
+
+
+def build_weights(path=WEIGHTS_PATH):
+    """
+    Write the hand-tuned weights to an .npz file
+    """
+    import numpy as np
+    edge = np.array([_edge_value(_digits(index, 8))
+                    for index in range(EDGE_SIZE)], dtype=np.int16)
+    corner = np.array([_corner_value(_digits(index, 9))
+                      for index in range(CORNER_SIZE)], dtype=np.int16)
+    # Weights of the mobility, potential mobility and stability differences
+    features = np.array([40, 15, 60], dtype=np.int16)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, edge=edge, corner=corner, features=features)
+
+
+if __name__ == "__main__":
+    build_weights()
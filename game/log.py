@@ -0,0 +1,16 @@
+"""
+Logger of the engine
+
+loguru is only imported when a message is logged for the first time, so
+that the rules and the search can be imported quickly. The messages go to
+the loguru logger, configured as usual by the applications.
+"""
+
+
+class _Logger:
+    def __getattr__(self, name):
+        from loguru import logger
+        return getattr(logger, name)
+
+
+logger = _Logger()
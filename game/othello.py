@@ -1,17 +1,39 @@
-import numpy as np
-import pygame
-import hashlib
-from constants.events import GAME_IS_OVER_EVENT
-from enum import Enum
+"""
+Rules of Othello
 
+The rules and the search do not depend on pygame: the interface is told
+that a game is over by the optional OthelloGame.on_game_over callback.
+"""
+import copy
+from collections import namedtuple
+from game import bitboard, evaluation, symmetry, zobrist
 
-class GameState(Enum):
+# Index of each symbol in OthelloGame.bitboards
+SYMBOLS = ("B", "W")
+COLORS = {symbol: index for index, symbol in enumerate(SYMBOLS)}
+
+
+class GameState:
+    """
+    States of a game, plain integers to keep the checks of place_piece cheap
+    """
     INITIAL = 0
     PLAYING = 1
     GAME_OVER = 2
 
 
+# Everything needed by OthelloGame.unmake_move to restore a position
+# (collections.namedtuple is used because importing typing is slow)
+UndoRecord = namedtuple("UndoRecord", ["position", "flips", "previous_color", "previous_last_move",
+                                       "is_pass", "previous_hash", "previous_cache"])
+
+
 class OthelloGame:
+    __slots__ = ("state", "players", "color", "is_playing_against_ai", "last_move", "is_simulated",
+                 "on_game_over",
+                 "_board", "_board_bitboards", "bitboards", "_cache", "undo_records",
+                 "empty_cells", "hash")
+
     DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1),
                   (-1, 0), (-1, -1), (0, -1), (1, -1)]
 
@@ -23,22 +45,105 @@ class OthelloGame:
         self.state = GameState.INITIAL
 
         self.players = None
-        self.current_player = None
+        # Index of the player to move in players and of his pieces in bitboards
+        self.color = COLORS["B"]
         self.is_playing_against_ai = False
 
         self.last_move = None
         self.is_simulated = False
+        # Called with the game when a move ends it, unless the game is simulated
+        self.on_game_over = None
 
-        # Set the initial board
-        self.board = np.empty((8, 8), dtype=str)
+        # Cache of the board view, see the board property
+        self._board = None
+        self._board_bitboards = None
+
+        # Set the initial board, one bitboard per symbol, black is to move
+        bitboards = [0, 0]
         for (x, y), player in [((3, 3), "W"), ((3, 4), "B"), ((4, 3), "B"), ((4, 4), "W")]:
-            self.board[x][y] = player
+            bitboards[COLORS[player]] |= 1 << bitboard.square(x, y)
+        self.set_position(bitboards, "B")
+
+        self.state = GameState.PLAYING
+
+    @classmethod
+    def from_position(cls, bitboards, symbol="B", is_playing_against_ai=False):
+        """
+        Create a game with its players from the bitboards of a position
+        and the symbol of the player to move
+        """
+        game = cls()
+        game.set_players(is_playing_against_ai=is_playing_against_ai)
+        game.set_position(bitboards, symbol)
+        return game
+
+    def set_position(self, bitboards, symbol="B"):
+        """
+        Set the pieces of the board and the symbol of the player to move
+        The history of the moves is cleared
+        """
+        self.bitboards = list(bitboards)
+        self.last_move = None
+
+        # Bitboards of the current position computed on demand: the legal moves of each
+        # color, the stable pieces and the frontier pieces of both colors, then the pieces
+        # known to be stable, as the stable pieces of a previous position never flip again
+        self._cache = [None, None, None, None, 0]
+
+        # Undo records of the moves played with place_piece
+        self.undo_records = []
 
         # Set the empty cells
+        occupied = self.bitboards[0] | self.bitboards[1]
         self.empty_cells = set([(i, j) for i in range(8)
-                               for j in range(8) if self.board[i][j] == ""])
+                               for j in range(8) if not occupied >> bitboard.square(i, j) & 1])
 
-        self.state = GameState.PLAYING
+        # Zobrist key of the position, including the player to move
+        self.hash = zobrist.get_hash(self.bitboards, COLORS[symbol])
+        self.color = COLORS[symbol]
+
+    @property
+    def current_player(self):
+        """
+        Return the player to move, None until the players are set
+        """
+        return self.players[self.color] if self.players is not None else None
+
+    @property
+    def board(self):
+        """
+        Return the board as an 8x8 array of symbols ("" for an empty cell)
+        The array is rebuilt from the bitboards only when they changed
+        """
+        if self._board is None or self._board_bitboards != self.bitboards:
+            import numpy as np
+            board = np.empty((8, 8), dtype=str)
+            for color, symbol in enumerate(SYMBOLS):
+                for square in bitboard.iter_squares(self.bitboards[color]):
+                    board[bitboard.position(square)] = symbol
+            self._board = board
+            self._board_bitboards = list(self.bitboards)
+        return self._board
+
+    def copy(self):
+        """
+        Return a snapshot of the game that can be searched without touching this one
+        The players are shared, the snapshot never posts events
+        """
+        snapshot = copy.copy(self)
+        snapshot.bitboards = list(self.bitboards)
+        snapshot._cache = list(self._cache)
+        snapshot.empty_cells = set(self.empty_cells)
+        snapshot.undo_records = list(self.undo_records)
+        snapshot.is_simulated = True
+        return snapshot
+
+    def get_own_and_opponent(self):
+        """
+        Return the bitboards of the current player and of his opponent
+        """
+        color = self.color
+        return self.bitboards[color], self.bitboards[1 - color]
 
     def set_players(self, is_playing_against_ai=False):
         """
@@ -49,7 +154,7 @@ class OthelloGame:
         self.is_playing_against_ai = is_playing_against_ai
         self.players = (Player("Player 1", "B"), Player(
             "Player 2" if not self.is_playing_against_ai else "AI", "W", is_ai=self.is_playing_against_ai))
-        self.current_player = self.players[0]
+        self.color = COLORS["B"]
 
     def is_playable_position(self, position):
         """
@@ -58,15 +163,80 @@ class OthelloGame:
         and that can be flipped in at least one direction
         """
         x, y = position
-        if self.board[x][y] != "" or not self.is_cell_on_board(x, y):
+        if not self.is_cell_on_board(x, y):
             return False
-        return any(self.can_flip_in_direction(x, y, direction) for direction in self.DIRECTIONS)
+        return bool(self.get_playable_bitboard() >> bitboard.square(x, y) & 1)
+
+    def get_color_playable_bitboard(self, color):
+        """
+        Return the playable positions of a color as a bitboard
+        They are computed once per position, making or unmaking a move resets them
+        """
+        moves = self._cache[color]
+        if moves is None:
+            moves = bitboard.get_moves(
+                self.bitboards[color], self.bitboards[1 - color])
+            self._cache[color] = moves
+        return moves
+
+    def get_playable_bitboard(self):
+        """
+        Return the playable positions of the current player as a bitboard
+        """
+        return self.get_color_playable_bitboard(self.color)
+
+    def get_opponent_playable_bitboard(self):
+        """
+        Return the playable positions of the opponent of the current player as a bitboard
+        """
+        return self.get_color_playable_bitboard(1 - self.color)
+
+    def get_stable_bitboard(self):
+        """
+        Return the pieces of both colors that can never be flipped, see evaluation.get_stable
+        They are computed once per position, starting from the stable pieces of the
+        previous positions
+        """
+        stable = self._cache[2]
+        if stable is None:
+            black, white = self.bitboards
+            known = self._cache[4]
+            safe_axes = evaluation.get_safe_axes(black | white)
+            stable = (evaluation.get_stable(black, white, safe_axes, known & black) |
+                      evaluation.get_stable(white, black, safe_axes, known & white))
+            self._cache[2] = stable
+        return stable
+
+    def get_frontier_bitboard(self):
+        """
+        Return the pieces of both colors adjacent to an empty cell
+        They are computed once per position, unmaking a move restores them
+        """
+        frontier = self._cache[3]
+        if frontier is None:
+            occupied = self.bitboards[0] | self.bitboards[1]
+            frontier = occupied & evaluation.get_neighbours(
+                ~occupied & bitboard.FULL)
+            self._cache[3] = frontier
+        return frontier
+
+    def has_legal_move(self):
+        """
+        Check if the current player can play
+        """
+        return self.get_playable_bitboard() != 0
+
+    def must_pass(self):
+        """
+        Check if the current player cannot play while his opponent can
+        """
+        return self.get_playable_bitboard() == 0 and self.get_opponent_playable_bitboard() != 0
 
     def get_playable_positions(self):
         """
         Return the playable positions
         """
-        return [position for position in self.empty_cells if self.is_playable_position(position)]
+        return [bitboard.position(square) for square in bitboard.iter_squares(self.get_playable_bitboard())]
 
     def is_cell_on_board(self, x, y):
         """
@@ -80,61 +250,84 @@ class OthelloGame:
             return False
 
         # Check if the position is playable
-        playable_positions = self.get_playable_positions()
-        if (x, y) not in playable_positions:
+        if not self.is_playable_position((x, y)):
             return False
 
-        # Place the piece
-        self.board[x][y] = self.current_player.symbol
-        self.empty_cells.discard((x, y))
-        self.last_move = (x, y)
-
-        # Flip the opponent pieces
-        for direction in self.DIRECTIONS:
-            if self.can_flip_in_direction(x, y, direction):
-                self.flip_in_direction(x, y, direction)
-
-        # Change the current player
-        # self.current_player = self.players[(
-        #     self.players.index(self.current_player) + 1) % 2]
-        self.current_player = self.other_player(self.current_player)
+        # Place the piece, flip the opponent pieces and change the current player
+        self.undo_records.append(self.make_move((x, y)))
 
         # Check if the game is over
         if self.is_game_over():
             if not self.is_simulated:
                 self.state = GameState.GAME_OVER
-                pygame.event.post(pygame.event.Event(GAME_IS_OVER_EVENT))
+                if self.on_game_over is not None:
+                    self.on_game_over(self)
             return True
 
+        # The next player has to pass if he cannot play
+        if not self.has_legal_move():
+            self.undo_records.append(self.make_move(None))
+        return True
+
+    def make_move(self, position):
+        """
+        Play a move for the current player without any check and return its undo record
+        The position must be playable, None means that the current player passes
+        """
+        color, previous_last_move = self.color, self.last_move
+        previous_hash, previous_cache = self.hash, self._cache
+        flips = 0
+        # A pass does not change the board, so the bitboards of the cache are kept
+        if position is not None:
+            x, y = position
+            own, opponent = self.bitboards[color], self.bitboards[1 - color]
+            square = x * 8 + y
+            flips = bitboard.get_flips(own, opponent, square)
+            self.bitboards[color] = own | flips | (1 << square)
+            self.bitboards[1 - color] = opponent ^ flips
+            self.empty_cells.discard(position)
+            self.last_move = position
+            self.hash ^= zobrist.PIECE_KEYS[color][square] ^ zobrist.get_flips_hash(
+                flips)
+            stable = previous_cache[2]
+            self._cache = [None, None, None, None,
+                           previous_cache[4] if stable is None else stable]
+
+        self.hash ^= zobrist.SIDE_KEY
+        self.color = 1 - color
+        # tuple.__new__ skips the Python level constructor of the named tuple
+        return tuple.__new__(UndoRecord, (position, flips, color, previous_last_move, position is None,
+                                          previous_hash, previous_cache))
+
+    def unmake_move(self, record):
+        """
+        Restore the position as it was before the move of an undo record
+        """
+        self.color = record.previous_color
+        self.last_move = record.previous_last_move
+        self.hash = record.previous_hash
+        self._cache = record.previous_cache
+        if record.is_pass:
+            return
+
+        x, y = record.position
+        color = self.color
+        self.bitboards[color] ^= record.flips | (1 << (x * 8 + y))
+        self.bitboards[1 - color] ^= record.flips
+        self.empty_cells.add(record.position)
+
     def is_game_over(self):
         """
         Check if the game is over
         """
-        # Check if the current player has possible moves
-        if len(self.get_playable_positions()) == 0:
-            # The current player has no possible moves
-            # Check if his opponent has possible moves
-            self.current_player = self.other_player(self.current_player)
-            if len(self.get_playable_positions()) == 0:
-                # The opponent has no possible moves
-                # The game is over
-                self.current_player = self.other_player(self.current_player)
-                return True
-            else:
-                # The opponent has possible moves
-                # The game is not over
-                self.current_player = self.other_player(self.current_player)
-                return False
-
-        # The current player has possible moves
-        # The game is not over
-        return False
+        # The game is over when neither the current player nor his opponent can play
+        return self.get_playable_bitboard() == 0 and self.get_opponent_playable_bitboard() == 0
 
     def other_player(self, player):
         """
         Return the opponent player for a given player
         """
-        return self.players[1] if player == self.players[0] else self.players[0]
+        return self.players[1 - player.color]
 
     def can_flip_in_direction(self, x, y, direction):
         """
@@ -142,58 +335,66 @@ class OthelloGame:
         """
         if direction is None:
             return False
-
-        # Checking position
-        actual_position = np.array([x, y]) + direction
-        # Check if an opponent piece is found
-        found_opponent_piece = False
-
-        while self.is_cell_on_board(actual_position[0], actual_position[1]):
-            cell = self.board[actual_position[0]][actual_position[1]]
-            if cell == "":
-                return False
-            elif cell == self.current_player.opponent_symbol:
-                found_opponent_piece = True
-            elif cell == self.current_player.symbol:
-                return found_opponent_piece
-            actual_position += direction
-
-        return False
+        return self.get_flips_in_direction(x, y, direction) != 0
 
     def flip_in_direction(self, x, y, direction):
         """
         Flip pieces in a given direction
         """
-        actual_position = np.array([x, y]) + direction
-
-        while self.board[actual_position[0]][actual_position[1]] != self.current_player.symbol:
-            self.board[actual_position[0]][actual_position[1]
-                                           ] = self.current_player.symbol
-            actual_position += direction
+        flips = self.get_flips_in_direction(x, y, direction)
+        color = self.color
+        self.bitboards[color] |= flips
+        self.bitboards[1 - color] ^= flips
+        self.hash ^= zobrist.get_flips_hash(flips)
+        self._cache = [None, None, None, None, self._cache[4]]
+
+    def get_flips_in_direction(self, x, y, direction):
+        """
+        Return the bitboard of the pieces flipped in a given direction
+        """
+        own, opponent = self.get_own_and_opponent()
+        amount, mask = bitboard.SHIFTS[self.DIRECTIONS.index(direction)]
+        return bitboard.get_flips_in_direction(own, opponent, bitboard.square(x, y), amount, mask)
 
     def get_player_score(self, player_symbol):
         """
         Return the score of a player
         """
-        return np.count_nonzero(self.board == player_symbol)
+        return bitboard.count(self.bitboards[COLORS[player_symbol]])
 
     def undo_last_move(self) -> None:
         """
         Undo the last move
         """
-        if self.last_move is None:
-            return
-        x, y = self.last_move
-        self.board[x][y] = ""
-        self.empty_cells.add((x, y))
-        self.current_player = self.other_player(self.current_player)
-        self.last_move = None
+        # Undo the automatic pass along with the move that caused it
+        while self.undo_records:
+            record = self.undo_records.pop()
+            self.unmake_move(record)
+            if not record.is_pass:
+                break
+        self.state = GameState.PLAYING
+
+    def get_move_history(self):
+        """
+        Return the moves played with place_piece since the position was set,
+        as (x, y) cells and None for the passes
+        """
+        return [record.position for record in self.undo_records]
 
     def get_hash(self):
         """
-        Return the hash of the board
+        Return the Zobrist key of the position, including the player to move
+        """
+        return self.hash
+
+    def get_canonical_hash(self):
+        """
+        Return the Zobrist key of the canonical form of the position, shared by the
+        positions equivalent by symmetry, and the transform mapping the position to it
+        See game.symmetry
         """
-        return hashlib.md5(self.board.tobytes()).hexdigest()
+        canonical, transform = symmetry.canonicalize(self.bitboards)
+        return zobrist.get_hash(canonical, self.color), transform
 
     def get_winner(self) -> str:
         """
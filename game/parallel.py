@@ -0,0 +1,209 @@
+"""
+Root search of the AI spread over several processes
+
+The moves of the root are split between the workers of a process pool
+("young brothers wait"): the most promising move is searched first with a
+full window, then all the other moves are searched in parallel with its
+score as alpha bound. Every task uses a fresh player and only depends on
+its arguments, so the result is the same for a given depth whatever the
+number of workers or the order in which the tasks complete.
+
+A task only searches its depth: instead of deepening from depth 1 to fill
+its transposition table, it gets the best moves found below its root move
+by the previous depth, which order the moves as well for a fraction of the
+nodes. The node budget of a depth is split between its tasks.
+
+Player.search uses it when the player has `search_workers` above 1, one
+depth of its iterative deepening at a time within the budget of the search.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from game.log import logger
+from game import bitboard
+from game.othello import OthelloGame
+from game.player import Player, INFINITY, SearchTimeout
+from game.transposition import UPPER_BOUND
+
+# Seconds between two checks of the stop event while waiting for the workers
+POLL_INTERVAL = 0.05
+
+def create_process_pool(max_workers=None, min_workers=2, **options):
+    """
+    Return the number of workers, one per CPU by default, and a process pool of that size
+    The pool is None below `min_workers` workers or if no process can be started, the
+    work then runs in the current process. `options` are passed to the ProcessPoolExecutor
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers < min_workers:
+        return max_workers, None
+    try:
+        return max_workers, ProcessPoolExecutor(max_workers=max_workers, **options)
+    except (OSError, NotImplementedError) as e:
+        logger.warning("Process pool unavailable, running in the current process: {}", e)
+        return max_workers, None
+
+
+# Minimum remaining depth of the positions whose best move is passed to the next depth,
+# the positions closer to the leaves are too many for what they save
+HINT_DEPTH = 2
+
+
+def search_move(bitboards, symbol, square, depth, alpha, beta, deadline=None, node_limit=None,
+                hints=None, stop_event=None):
+    """
+    Search one root move up to a depth and return its score for the player
+    who played it, or None if the budget ran out, the number of nodes searched
+    and the hints of the next depth: the best moves of the positions searched, by Zobrist key
+    `hints` are the hints of the previous depth, `deadline` is a time.time() timestamp,
+    the same in every process
+    The position is rebuilt from its bitboards, so it can run in any process
+    """
+    game = OthelloGame.from_position(bitboards, symbol)
+    player = game.current_player
+    if deadline is not None:
+        player.deadline = time.perf_counter() + deadline - time.time()
+    player.node_limit = node_limit
+    player.stop_event = stop_event
+    player.depth_limit = depth
+    # A hint is stored without depth, it only orders the moves
+    table = player.transposition_table
+    for key, move in (hints or {}).items():
+        table.store(key, 0, UPPER_BOUND, INFINITY, move)
+
+    record = game.make_move(bitboard.position(square))
+    try:
+        score = -player.negamax(game, 1, -beta, -alpha)
+    except SearchTimeout:
+        score = None
+    game.unmake_move(record)
+    hints = {entry[0]: entry[4] for entry in table.entries
+             if entry is not None and entry[1] >= HINT_DEPTH and entry[4] is not None}
+    return score, player.nodes, hints
+
+
+class ParallelSearch:
+    """
+    Process pool searching the root moves of positions in parallel
+    With `max_workers=1`, or if no process can be started, the moves are searched
+    one after another in the current process
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers, self.executor = create_process_pool(max_workers)
+        # Hints of the root moves of the last position searched, see search_move
+        self.hints_position = None
+        self.hints = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_hints(self, bitboards, symbol):
+        """
+        Return the hints of the root moves of a position, by square, they are forgotten
+        when another position is searched
+        """
+        if self.hints_position != (bitboards, symbol):
+            self.hints_position = (bitboards, symbol)
+            self.hints = {}
+        return self.hints
+
+    def close(self):
+        """
+        Shut down the worker processes
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def map(self, tasks, stop_event=None):
+        """
+        Run search_move for each tuple of arguments and return the results in the same order
+        Raise SearchTimeout if the optional threading.Event `stop_event` is set, the tasks
+        already running in the workers then finish within their own budget
+        """
+        if self.executor is None:
+            return [search_move(*task, stop_event=stop_event) for task in tasks]
+        futures = [self.executor.submit(search_move, *task) for task in tasks]
+        while wait(futures, timeout=POLL_INTERVAL)[1]:
+            if stop_event is not None and stop_event.is_set():
+                for future in futures:
+                    future.cancel()
+                raise SearchTimeout()
+        return [future.result() for future in futures]
+
+    def search_root(self, game, depth, first_move=None, player=None):
+        """
+        Search the root moves of a game up to a depth, `first_move` first if it is given
+        Return the best move, its score for the player to move and the number of nodes searched
+        The moves are searched with the hints of the last depth searched in the same position
+        With a `player`, the search counts its nodes and stays within its budget: every
+        task gets the time left and a share of the nodes left, and SearchTimeout is raised
+        if the depth could not be completed within them
+        """
+        bitboards = tuple(game.bitboards)
+        symbol = game.current_player.symbol
+        moves = game.get_playable_bitboard()
+        if not moves:
+            return None, None, 0
+        hints = self.get_hints(bitboards, symbol)
+
+        deadline = node_limit = stop_event = None
+        if player is not None:
+            if player.deadline != float("inf"):
+                deadline = time.time() + player.deadline - time.perf_counter()
+            if player.node_limit is not None:
+                node_limit = player.node_limit - player.nodes
+            stop_event = player.stop_event
+
+        # The order of the moves only depends on the position and on the first move
+        orderer = Player("Orderer", symbol)
+        squares = list(orderer.order_moves(game, moves, 0, depth))
+        if first_move is not None:
+            squares.remove(bitboard.square(*first_move))
+            squares.insert(0, bitboard.square(*first_move))
+
+        # The eldest brother gives the alpha bound of the others, a task stops
+        # one node after its limit
+        (best_score, nodes, hints[squares[0]]), = self.map(
+            [(bitboards, symbol, squares[0], depth, -INFINITY, INFINITY, deadline,
+              None if node_limit is None else max(node_limit - 1, 0), hints.get(squares[0]))],
+            stop_event)
+        best_square = squares[0]
+
+        # A younger brother is only chosen if it is strictly better,
+        # the ties are broken by the order of the moves
+        results = []
+        if best_score is not None and len(squares) > 1:
+            share = None
+            if node_limit is not None:
+                # The tasks run at the same time, they split the nodes left
+                share = max((node_limit - nodes) // (len(squares) - 1) - 1, 0)
+            results = self.map([(bitboards, symbol, square, depth, best_score, INFINITY, deadline,
+                                 share, hints.get(square)) for square in squares[1:]], stop_event)
+        for square, (_, task_nodes, task_hints) in zip(squares[1:], results):
+            nodes += task_nodes
+            hints[square] = task_hints
+        if player is not None:
+            player.nodes += nodes
+            if best_score is None or any(score is None for score, _, _ in results) or \
+                    (node_limit is not None and nodes > node_limit):
+                raise SearchTimeout()
+
+        for square, (score, _, _) in zip(squares[1:], results):
+            if score > best_score:
+                best_score, best_square = score, square
+
+        return bitboard.position(best_square), best_score, nodes
+
+
+def parallel_search_root(game, depth, max_workers=None):
+    """
+    Search the root moves of a game up to a depth with a temporary process pool
+    Return the best move, its score for the player to move and the number of nodes searched
+    """
+    with ParallelSearch(max_workers) as search:
+        return search.search_root(game, depth)
@@ -1,13 +1,53 @@
 import random
 import time
-import numpy as np
-import copy
-from loguru import logger
-from game.othello import GameState
+from game.log import logger
+from game import bitboard
+from game.othello import GameState, COLORS
+from game.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from game.stats import SearchStats
+from game.endgame import EndgameSolver
+from game.evaluation import get_default_evaluator, DISC_SCORE
+
+
+# Bigger than any score returned by the search
+INFINITY = 1 << 30
+
+# Static value of the squares used to order the moves:
+# corners first, squares next to an empty corner last
+SQUARE_ORDERING_VALUES = [
+    20, -5, 4, 2, 2, 4, -5, 20,
+    -5, -10, 0, 0, 0, 0, -10, -5,
+    4, 0, 2, 1, 1, 2, 0, 4,
+    2, 0, 1, 0, 0, 1, 0, 2,
+    2, 0, 1, 0, 0, 1, 0, 2,
+    4, 0, 2, 1, 1, 2, 0, 4,
+    -5, -10, 0, 0, 0, 0, -10, -5,
+    20, -5, 4, 2, 2, 4, -5, 20,
+]
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when its time or node budget is exhausted
+    """
 
 
 class Player:
+    __slots__ = ("name", "symbol", "opponent_symbol", "color", "is_ai", "transposition_table",
+                 "evaluator", "use_book", "book", "endgame_solver", "endgame_empties", "depth_limit",
+                 "deadline", "node_limit", "stop_event", "nodes", "interior_nodes",
+                 "generated_moves", "cutoffs", "stability_cutoffs", "killers", "history", "move_stack",
+                 "ponder_results", "search_workers", "parallel_search", "stats", "stats_output",
+                 "profile_path", "profiler")
+
     MAX_DEPTH = 20
+    # Default time budget of a move in seconds
+    TIME_LIMIT = 2.0
+    # Minimum remaining depth to order the moves by the opponent mobility
+    MOBILITY_ORDERING_DEPTH = 4
+    # Default number of empty cells below which the game is solved exactly, when the
+    # solver is expected to finish within the budget of the search
+    ENDGAME_EMPTIES = 12
 
     def __init__(self, name, symbol, is_ai=False):
         """
@@ -16,100 +56,528 @@ class Player:
         self.name = name
         self.symbol = symbol
         self.opponent_symbol = "W" if symbol == "B" else "B"
+        # Index of the player in OthelloGame.players and of his pieces in OthelloGame.bitboards
+        self.color = COLORS[symbol]
         self.is_ai = is_ai
 
+        # Search results shared between the moves of the AI
+        self.transposition_table = TranspositionTable()
+
+        # Static evaluation of the positions at the depth limit, loaded by the first evaluation
+        self.evaluator = None
+
+        # Play the moves of the opening book without searching,
+        # the book is opened by the first call to best_move
+        self.use_book = True
+        self.book = None
+
+        # Exact search of the last moves
+        self.endgame_solver = EndgameSolver(self)
+        self.endgame_empties = Player.ENDGAME_EMPTIES
+
+        # Limits of the current search, see best_move
+        self.depth_limit = Player.MAX_DEPTH
+        self.deadline = float("inf")
+        self.node_limit = None
+        self.stop_event = None
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.generated_moves = 0
+        self.cutoffs = [0] * 64
+        self.stability_cutoffs = 0
+
+        # Move ordering heuristics, killers by depth and history by color and square
+        self.killers = [[None, None] for _ in range(Player.MAX_DEPTH + 64)]
+        self.history = [[0] * 64 for _ in range(2)]
+
+        # Ordered moves of each depth, the lists are reused by all the nodes of a depth
+        self.move_stack = [[] for _ in range(Player.MAX_DEPTH + 64)]
+
+        # SearchStats of the positions searched while pondering, by Zobrist key, see ponder
+        self.ponder_results = {}
+
+        # Number of processes searching the root moves, see game.parallel, the pool
+        # is started by the first search using it and shut down by close
+        self.search_workers = 1
+        self.parallel_search = None
+
+        # Statistics of the last search, see search
+        self.stats = SearchStats(self.name)
+        # Text stream receiving the statistics of each search as a JSON line
+        self.stats_output = None
+        # File receiving the cProfile statistics of all the searches
+        self.profile_path = None
+        self.profiler = None
+
     def place_piece(self, x, y, game):
         """
         Place a piece on the board
         """
-        logger.info(f"{self.name} is playing")
+        logger.info("{} is playing", self.name)
         if self.is_ai and game.state == GameState.PLAYING:
             # time.sleep(1)
             move = self.best_move(game)
             game.place_piece(move[0], move[1])
-            logger.info(
-                f"{self.name} is placing a piece at ({move[0]}, {move[1]})")
+            logger.info("{} is placing a piece at ({}, {})",
+                        self.name, move[0], move[1])
         else:
             game.place_piece(x, y)
-            logger.info(f"{self.name} is placing a piece at ({x}, {y})")
+            logger.info("{} is placing a piece at ({}, {})", self.name, x, y)
+
+    def best_move(self, game, time_limit=None, node_limit=None, stop_event=None):
+        """
+        Get the best move for the AI: the move of the opening book if the position is in
+        the book, else the result of the iterative deepening of the negamax algorithm
+        See search for the arguments
+        """
+        if self.use_book and self.book is None:
+            from game.book import get_default_book
+            self.book = get_default_book()
+        if self.use_book and self.book is not None:
+            move = self.book.get_move(game)
+            if move is not None:
+                logger.debug("{} plays {} from the opening book", self.name, move)
+                return move
+        return self.search(game, time_limit, node_limit, stop_event).move
+
+    def search(self, game, time_limit=None, node_limit=None, stop_event=None):
+        """
+        Search the best move by iterative deepening and return the SearchStats of the search
+        The search stops when the time limit (in seconds) or the node limit is reached,
+        or when the optional threading.Event `stop_event` is set,
+        the best move of the last completed depth is kept
+        With `search_workers` above 1, the root moves of each depth are searched over
+        a process pool, see game.parallel
+        """
+        if self.profile_path is not None:
+            if self.profiler is None:
+                import cProfile
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.transposition_table.new_search()
+        self.reset_move_ordering()
+        try:
+            stats = self.iterative_deepening(
+                game, time_limit, node_limit, stop_event)
+        finally:
+            if self.profile_path is not None:
+                self.profiler.disable()
+                self.profiler.dump_stats(self.profile_path)
+
+        if self.stats_output is not None:
+            self.stats_output.write(stats.to_json() + "\n")
+        return stats
+
+    def iterative_deepening(self, game, time_limit, node_limit, stop_event, max_depth=MAX_DEPTH):
+        """
+        Search one more depth at a time until the budget is exhausted or `max_depth` is reached,
+        see search
+        The move ordering is kept from the previous searches, search and ponder reset it
+        A search of the same position made while pondering is continued from its last depth
+        """
+        start = time.perf_counter()
+        stats = SearchStats(self.name)
+        self.stats = stats
+        self.cutoffs = stats.cutoffs
+        self.interior_nodes = 0
+        self.generated_moves = 0
+        self.stability_cutoffs = 0
+        self.nodes = 0
+        solver_stability_cutoffs = self.endgame_solver.stability_cutoffs
+        table_probes = self.transposition_table.probes
+        table_hits = self.transposition_table.hits
+
+        playable_positions = game.get_playable_positions()
+        if len(playable_positions) <= 1:
+            stats.move = playable_positions[0] if playable_positions else None
+            return stats
+
+        # Set the budget of the search
+        time_limit = Player.TIME_LIMIT if time_limit is None else time_limit
+        self.deadline = start + time_limit
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+
+        parallel_search = self.get_parallel_search(time_limit, node_limit)
+
+        # Near the end the game is solved once the solver is expected to finish in time,
+        # until then the search deepens as usual and gives the move if the solver fails
+        solve_endgame = len(game.empty_cells) <= self.endgame_empties
+
+        best_move, first_depth = playable_positions[0], 1
+        pondered = self.ponder_results.get(game.get_hash())
+        if pondered is not None and pondered.depth_reached:
+            best_move, first_depth = pondered.move, pondered.depth_reached + 1
+            stats.score, stats.depth_reached = pondered.score, pondered.depth_reached
+            stats.solved, stats.pondered_depth = pondered.solved, pondered.depth_reached
+            stats.iterations = list(pondered.iterations)
+
+        for depth in range(first_depth, max_depth + 1):
+            # The whole game has been searched, a deeper search gives the same result
+            if stats.depth_reached >= len(game.empty_cells):
+                break
+            # Answer now rather than start a depth that would not be completed in time,
+            # unless the search must be reproducible
+            iteration_start = time.perf_counter()
+            if node_limit is None and iteration_start + self.predict_iteration_time(stats) > self.deadline:
+                stats.stopped = True
+                break
+            iteration_nodes = self.nodes
+            try:
+                if solve_endgame and self.can_solve(stats, len(game.empty_cells), iteration_start):
+                    best_move, best_score = self.endgame_solver.solve(
+                        game, best_move)
+                    best_score *= DISC_SCORE
+                    depth = len(game.empty_cells)
+                    stats.solved = True
+                elif parallel_search is not None:
+                    best_move, best_score, _ = parallel_search.search_root(
+                        game, depth, best_move, self)
+                else:
+                    best_move, best_score = self.search_root(
+                        game, depth, best_move)
+            except SearchTimeout:
+                stats.stopped = True
+                break
+            stats.move, stats.score, stats.depth_reached = best_move, best_score, depth
+            stats.iterations.append({
+                "depth": depth,
+                "move": list(best_move),
+                "score": best_score,
+                "nodes": self.nodes - iteration_nodes,
+                "seconds": round(time.perf_counter() - start, 6),
+                "iteration_seconds": round(time.perf_counter() - iteration_start, 6),
+            })
+            logger.debug("{} searched depth {} ({} nodes): {} scores {}",
+                         self.name, depth, self.nodes, best_move, best_score)
+
+        stats.move = best_move
+        stats.nodes = self.nodes
+        stats.interior_nodes = self.interior_nodes
+        stats.generated_moves = self.generated_moves
+        stats.stability_cutoffs = self.stability_cutoffs + \
+            self.endgame_solver.stability_cutoffs - solver_stability_cutoffs
+        stats.table_probes = self.transposition_table.probes - table_probes
+        stats.table_hits = self.transposition_table.hits - table_hits
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def get_parallel_search(self, time_limit, node_limit):
+        """
+        Return the process pool searching the root moves, started on first use,
+        or None if the search runs in this process
+        The workers only stop on their own budget, so a search without a time or node
+        limit, such as pondering, runs in this process
+        """
+        if self.search_workers <= 1 or (time_limit == float("inf") and node_limit is None):
+            return None
+        if self.parallel_search is None:
+            from game.parallel import ParallelSearch
+            self.parallel_search = ParallelSearch(self.search_workers)
+        return self.parallel_search
+
+    def close(self):
+        """
+        Shut down the worker processes of the parallel search
+        """
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+
+    def predict_iteration_time(self, stats):
+        """
+        Return the expected duration in seconds of the next depth of a search,
+        from the growth of the number of nodes of its last two depths
+        """
+        if len(stats.iterations) < 2:
+            return 0.0
+        previous, last = stats.iterations[-2:]
+        growth = last["nodes"] / previous["nodes"] if previous["nodes"] else 1.0
+        return last["iteration_seconds"] * growth
 
-    def best_move(self, game):
+    def predict_solve_cost(self, stats, empties):
         """
-        Get the best move for the AI using the minimax algorithm
+        Return the expected nodes and seconds of solving a position with `empties` empty cells,
+        from the growth of the number of nodes of the last depths of its search extended to the
+        end of the game, or None before three depths are completed
+        The solver visits about as many nodes as a search of the same depth, but each of them
+        costs less, so the seconds are overestimated
         """
-        best_move = None
-        best_score = -np.inf
+        if len(stats.iterations) < 3:
+            return None
+        before, _, last = stats.iterations[-3:]
+        # Growth of one depth measured over two, odd and even depths grow differently
+        growth = (last["nodes"] / before["nodes"]) ** 0.5 if before["nodes"] else 1.0
+        factor = max(growth, 1.0) ** (empties - last["depth"])
+        return last["nodes"] * factor, last["iteration_seconds"] * factor
 
-        # Make a copy of the game for simulation
-        simulated_game = copy.deepcopy(game)
-        simulated_game.is_simulated = True
+    def can_solve(self, stats, empties, now):
+        """
+        Check if the solver is expected to finish within the remaining budget of a search,
+        the node budget if the search must be reproducible, else the time budget
+        """
+        cost = self.predict_solve_cost(stats, empties)
+        if cost is None:
+            return False
+        nodes, seconds = cost
+        if self.node_limit is not None:
+            return self.nodes + nodes <= self.node_limit
+        return now + seconds <= self.deadline
 
-        # Get all playable positions
-        playable_positions = simulated_game.get_playable_positions()
+    def ponder(self, game, stop_event):
+        """
+        Search on the time of the opponent, who is to move in `game`, until `stop_event` is set
+        The positions after each of his replies are searched one more depth at a time, in
+        the order of the move ordering, so the most likely replies are searched deeper.
+        The results are kept in ponder_results, the search of the reply actually played
+        continues from them and the transposition table is already filled
+        """
+        self.ponder_results = {}
+        self.transposition_table.new_search()
+        # The searches of all the replies share the move ordering, it is only reset here
+        self.reset_move_ordering()
+        replies = []
+        for square in list(self.order_moves(game, game.get_playable_bitboard(), 0, 1)):
+            reply = game.copy()
+            reply.place_piece(*bitboard.position(square))
+            # After some replies the opponent plays again or the game is over
+            if reply.current_player is self and not reply.is_game_over():
+                replies.append(reply)
 
-        # Iterate through all playable positions
-        for x, y in playable_positions:
-            # Simulate placing a piece
-            simulated_game.place_piece(x, y)
+        for depth in range(1, Player.MAX_DEPTH + 1):
+            for reply in replies:
+                if stop_event.is_set():
+                    return
+                self.ponder_results[reply.get_hash()] = self.iterative_deepening(
+                    reply, float("inf"), None, stop_event, depth)
 
-            # Get the score of the simulated game
-            score = self.minimax(simulated_game, 0, False)
+    def search_root(self, game, depth, first_move=None):
+        """
+        Search all the playable positions up to a depth and return the best move and its score
+        The first move is searched first, usually the best move of the previous depth
+        """
+        self.depth_limit = depth
+        # The stable pieces of the root seed those of every position searched
+        game.get_stable_bitboard()
+        first_square = None if first_move is None else bitboard.square(
+            *first_move)
+        squares = self.order_moves(
+            game, game.get_playable_bitboard(), 0, depth, first_square)
+
+        best_square = squares[0]
+        alpha, beta = -INFINITY, INFINITY
+        for index, square in enumerate(squares):
+            score = self.search_move(game, square, 1, alpha, beta, index)
+            if score > alpha:
+                alpha = score
+                best_square = square
+
+        return bitboard.position(best_square), alpha
+
+    def search_move(self, game, square, depth, alpha, beta, index):
+        """
+        Play a move and return its score for the player who played it
+        The first move gets the full window, the next ones a null window that is
+        widened only if they turn out to be better (principal variation search)
+        """
+        record = game.make_move(bitboard.position(square))
+        # The move is undone even if the search is stopped
+        try:
+            if index == 0:
+                return -self.negamax(game, depth, -beta, -alpha)
+            score = -self.negamax(game, depth, -alpha - 1, -alpha)
+            if alpha < score < beta:
+                score = -self.negamax(game, depth, -beta, -alpha)
+            return score
+        finally:
+            game.unmake_move(record)
+
+    def check_budget(self):
+        """
+        Count a searched node and stop the search if its budget is exhausted
+        """
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if self.nodes & 255 == 0:
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout()
+
+    def evaluate(self, game):
+        """
+        Return the static score of a position for the player to move
+        """
+        if self.evaluator is None:
+            self.evaluator = get_default_evaluator()
+        own, opponent = game.get_own_and_opponent()
+        return self.evaluator.evaluate(own, opponent, game.get_playable_bitboard(),
+                                       game.get_opponent_playable_bitboard(),
+                                       game.get_stable_bitboard(), game.get_frontier_bitboard())
+
+    def negamax(self, game, depth, alpha, beta):
+        """
+        Negamax algorithm using alpha-beta pruning, the score is given for the player to move
+        `depth` is the number of moves played since the root of the search
+        """
+        self.check_budget()
 
-            # Undo the simulated move
-            simulated_game.undo_last_move()
+        moves = game.get_playable_bitboard()
+        if not moves:
+            # If nobody can play, the game is over
+            if not game.get_opponent_playable_bitboard():
+                own, opponent = game.get_own_and_opponent()
+                return (bitboard.count(own) - bitboard.count(opponent)) * DISC_SCORE
 
-            # If the score is better than the best score, update the best score and best move
+            # The current player cannot play, he passes
+            record = game.make_move(None)
+            try:
+                return -self.negamax(game, depth + 1, -beta, -alpha)
+            finally:
+                game.unmake_move(record)
+
+        # If the depth limit is reached, return the static score
+        if depth >= self.depth_limit:
+            return self.evaluate(game)
+
+        # The stable pieces of the opponent stay his until the end: if the best final
+        # score left to the player cannot beat alpha, the position fails low
+        opponent_pieces = game.bitboards[1 - game.color]
+        if (64 - 2 * bitboard.count(opponent_pieces)) * DISC_SCORE <= alpha:
+            bound = (64 - 2 * bitboard.count(opponent_pieces &
+                     game.get_stable_bitboard())) * DISC_SCORE
+            if bound <= alpha:
+                self.stability_cutoffs += 1
+                return bound
+
+        # Use the result of a previous search of the same position
+        remaining_depth = self.depth_limit - depth
+        key = game.get_hash()
+        entry = self.transposition_table.probe(key)
+        table_move = None
+        if entry is not None:
+            _, entry_depth, bound, entry_score, table_move, _ = entry
+            if entry_depth >= remaining_depth:
+                if bound == EXACT:
+                    return entry_score
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+        window_alpha, window_beta = alpha, beta
+
+        best_score = -INFINITY
+        best_square = None
+        squares = self.order_moves(
+            game, moves, depth, remaining_depth, table_move)
+        self.interior_nodes += 1
+        self.generated_moves += len(squares)
+        for index, square in enumerate(squares):
+            score = self.search_move(
+                game, square, depth + 1, alpha, beta, index)
             if score > best_score:
-                best_score = score
-                best_move = (x, y)
-
-        return best_move
-
-    def minimax(self, game, depth, isMaximizing, alpha=-np.inf, beta=np.inf):
-        """
-        Minimax algorithm using alpha-beta pruning to find the best move
-        """
-        # If the game is over, return the score
-        if depth == Player.MAX_DEPTH or game.is_game_over():
-            ai_score = game.get_player_score(self.symbol)
-            opponent_score = game.get_player_score(self.opponent_symbol)
-
-            return ai_score - opponent_score
-
-        # Get all playable positions
-        possible_moves = game.get_playable_positions()
-
-        # If the AI is maximizing, get the best score
-        if isMaximizing:
-            best_score = -np.inf
-            # Iterate through all playable positions and simulate placing a piece
-            for x, y in possible_moves:
-                game.place_piece(x, y)
-                # Recursively call minimax
-                score = self.minimax(game, depth + 1, False)
-                # Undo the simulated move and update the best score
-                game.undo_last_move()
-                best_score = max(score, best_score)
-                # If the best score is greater than beta, prune the branch
-                if best_score >= beta:
-                    break
-                # Update alpha
-                alpha = max(alpha, best_score)
-            return best_score
+                best_score, best_square = score, square
+            if score > alpha:
+                alpha = score
+            # The opponent will avoid this position, prune the other moves
+            if alpha >= beta:
+                self.cutoffs[index] += 1
+                self.record_cutoff(game, square, depth, remaining_depth)
+                break
+
+        # Store the result with the kind of bound it gives on the real score
+        if best_score <= window_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= window_beta:
+            bound = LOWER_BOUND
         else:
-            # If the AI is minimizing, get the best score
-            best_score = np.inf
-            # Iterate through all playable positions and simulate placing a piece
-            for x, y in possible_moves:
-                game.place_piece(x, y)
-                # Recursively call minimax
-                score = self.minimax(game, depth + 1, True)
-                # Undo the simulated move and update the best score
-                game.undo_last_move()
-                # If the best score is less than alpha, prune the branch
-                best_score = min(score, best_score)
-                if best_score <= alpha:
-                    break
-                # Update beta
-                beta = min(beta, best_score)
-            return best_score
+            bound = EXACT
+        self.transposition_table.store(
+            key, remaining_depth, bound, best_score, best_square)
+        return best_score
+
+    def get_principal_variation(self, game, first_move, max_length=MAX_DEPTH):
+        """
+        Return the moves expected from a position after a search: the first move,
+        then the moves stored in the transposition table, None for the passes
+        """
+        variation = []
+        records = []
+        move = first_move
+        try:
+            while move is not None and len(variation) < max_length:
+                records.append(game.make_move(move))
+                variation.append(move)
+                if not game.get_playable_bitboard():
+                    # The game is over, or the next player passes
+                    if not game.get_opponent_playable_bitboard():
+                        break
+                    records.append(game.make_move(None))
+                    variation.append(None)
+
+                entry = self.transposition_table.probe(game.get_hash())
+                move = None
+                if entry is not None and entry[4] is not None and game.get_playable_bitboard() >> entry[4] & 1:
+                    move = bitboard.position(entry[4])
+        finally:
+            for record in reversed(records):
+                game.unmake_move(record)
+        return variation
+
+    def reset_move_ordering(self):
+        """
+        Forget the killer moves and age the history scores before a new search
+        """
+        self.killers = [[None, None] for _ in range(Player.MAX_DEPTH + 64)]
+        self.history = [[value >> 1 for value in history]
+                        for history in self.history]
+
+    def record_cutoff(self, game, square, depth, remaining_depth):
+        """
+        Remember a move that caused a cutoff, to try it early in similar positions
+        """
+        killers = self.killers[depth]
+        if killers[0] != square:
+            killers[1] = killers[0]
+            killers[0] = square
+        self.history[game.color][square] += remaining_depth * remaining_depth
+
+    def order_moves(self, game, moves, depth, remaining_depth, table_move=None):
+        """
+        Return the squares of the moves sorted from the most to the least promising:
+        move of the transposition table, killer moves, then corners and moves leaving
+        few replies to the opponent, ties being broken by the history scores
+        The list returned is reused by the next call for the same depth
+        """
+        own, opponent = game.get_own_and_opponent()
+        history = self.history[game.color]
+        killers = self.killers[depth]
+        use_mobility = remaining_depth >= Player.MOBILITY_ORDERING_DEPTH
+
+        # Each move is sorted as the integer (score << 6) | square
+        ordered_moves = self.move_stack[depth]
+        ordered_moves.clear()
+        while moves:
+            lowest_bit = moves & -moves
+            moves ^= lowest_bit
+            square = lowest_bit.bit_length() - 1
+            if square == table_move:
+                score = 1 << 40
+            elif square in killers:
+                score = 1 << 32
+            else:
+                score = SQUARE_ORDERING_VALUES[square]
+                if use_mobility:
+                    flips = bitboard.get_flips(own, opponent, square)
+                    score -= bitboard.count(bitboard.get_moves(
+                        opponent ^ flips, own | flips | lowest_bit))
+                score = (score << 16) + min(history[square], 0xFFFF)
+            ordered_moves.append((score << 6) | square)
+
+        ordered_moves.sort(reverse=True)
+        for index, move in enumerate(ordered_moves):
+            ordered_moves[index] = move & 63
+        return ordered_moves
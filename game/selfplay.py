@@ -0,0 +1,146 @@
+"""
+Headless self-play: play games between AI and random players without any display
+
+Usage:
+    python -m game.selfplay --games 100 --black ai --white random --workers 4 --output games.jsonl
+
+Each finished game is written as one JSON line with its moves, final score and timings,
+or with `--format archive` to a compact binary archive, see game.archive.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from loguru import logger
+from game.othello import OthelloGame
+from game.archive import ArchiveWriter
+
+PLAYER_KINDS = ("ai", "random")
+OUTPUT_FORMATS = ("jsonl", "archive")
+
+
+def play_game(index=0, black="ai", white="ai", time_limit=None, node_limit=None, seed=None):
+    """
+    Play a whole game and return its result as a dictionary
+    `black` and `white` are "ai" or "random", the random players are seeded by `seed`
+    """
+    rng = random.Random(seed)
+    game = OthelloGame()
+    game.set_players()
+    game.is_simulated = True
+    kinds = {game.players[0]: black, game.players[1]: white}
+
+    moves = []
+    move_times = []
+    start = time.perf_counter()
+    while not game.is_game_over():
+        player = game.current_player
+        move_start = time.perf_counter()
+        if kinds[player] == "ai":
+            move = player.best_move(
+                game, time_limit=time_limit, node_limit=node_limit)
+        else:
+            move = rng.choice(game.get_playable_positions())
+        move_times.append(round(time.perf_counter() - move_start, 6))
+        game.place_piece(move[0], move[1])
+        moves.append([player.symbol, move[0], move[1]])
+
+    black_score = game.get_player_score("B")
+    white_score = game.get_player_score("W")
+    if black_score > white_score:
+        winner = "B"
+    elif black_score < white_score:
+        winner = "W"
+    else:
+        winner = "Tie"
+    return {
+        "game": index,
+        "black": black,
+        "white": white,
+        "seed": seed,
+        "moves": moves,
+        "black_score": black_score,
+        "white_score": white_score,
+        "winner": winner,
+        "duration": round(time.perf_counter() - start, 6),
+        "move_times": move_times,
+    }
+
+
+def run_games(games, black="ai", white="ai", time_limit=None, node_limit=None, seed=0, workers=None):
+    """
+    Play `games` games over `workers` processes and yield their results as soon as they finish
+    The game i uses the seed `seed + i`, with one worker the games are played in this process
+    """
+    workers = workers or os.cpu_count() or 1
+    arguments = ((index, black, white, time_limit, node_limit, seed + index)
+                 for index in range(games))
+    if workers == 1:
+        for args in arguments:
+            yield play_game(*args)
+        return
+
+    # Keep a bounded number of games in flight, so millions of games can be streamed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for args in arguments:
+            pending.add(executor.submit(play_game, *args))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Play headless Othello games and write their results as JSON lines")
+    parser.add_argument("--games", type=int, default=1,
+                        help="number of games to play")
+    parser.add_argument("--black", choices=PLAYER_KINDS, default="ai")
+    parser.add_argument("--white", choices=PLAYER_KINDS, default="ai")
+    parser.add_argument("--time", type=float, default=None,
+                        help="time limit of an AI move in seconds")
+    parser.add_argument("--nodes", type=int, default=None,
+                        help="node limit of an AI move, for reproducible games")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random players")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--output", default="-",
+                        help="file to write, - for stdout")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl",
+                        help="JSON lines, or a binary archive without the move times")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the logs of the search")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    results = run_games(args.games, args.black, args.white, args.time,
+                        args.nodes, args.seed, args.workers)
+    if args.format == "archive":
+        with ArchiveWriter(sys.stdout.buffer if args.output == "-" else args.output) as writer:
+            for result in results:
+                writer.write_result(result)
+        return
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
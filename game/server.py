@@ -0,0 +1,512 @@
+"""
+Match server: many games at once over a line protocol
+
+    python -m game.server --port 8765 --workers 4
+    python -m game.server --unix /tmp/othello.sock
+
+Clients connect over TCP or a Unix socket and exchange lines of words.
+A connection can host any number of games, the games are told apart by
+their id. Each player of a game is "ai" (searched by the server),
+"random" (played by the server) or "client" (played by the connection).
+
+Client to server:
+
+    NEW <black> <white> [<clock>]   start a game, the clock is in seconds per move
+    MOVE <id> <x> <y>               play a move for a client player, after its TURN line
+    STATS                           ask for the metrics of the server
+    QUIT                            close the connection
+
+Server to client:
+
+    GAME <id> <black> <white> <clock>
+    TURN <id> <symbol> <board> <clock>   a client player is to move, see analysis.format_board
+    MOVE <id> <symbol> <x> <y>           a move was played, by any player
+    PASS <id> <symbol>                   a player had to pass
+    OVER <id> <black score> <white score> <winner> <reason>
+    STATS <json>
+    ERROR <message>
+
+The winner is "B", "W" or "Tie", the reason is "end" or "time" when a
+player lost on time. If the server fails to play a move the game is
+aborted: its reason is "error" and its winner "-". The clock of a move starts with its TURN line for a
+client, and when a worker starts its search for the AI, so the time waiting
+for a free worker is not counted. The AI searches with a share of its
+clock, a search that still overruns it loses the game on time. With
+`--nodes` the AI searches up to a number of nodes instead and has no clock.
+
+The searches run on a bounded pool of worker processes fed by a queue,
+see SearchPool. The server keeps ServerMetrics: games per second, queue
+depth and percentiles of the move latencies. game.client load-tests it.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import sys
+import time
+from collections import deque
+
+from game.log import logger
+from game.analysis import format_board
+from game.othello import OthelloGame, SYMBOLS
+from game.parallel import create_process_pool
+
+PLAYER_KINDS = ("ai", "random", "client")
+
+# Default clock of a move in seconds
+CLOCK = 1.0
+
+# Share of its clock given to the search of the AI, the rest covers the
+# overhead of the worker processes
+SEARCH_SHARE = 0.8
+
+# Number of move latencies kept for the percentiles, by player kind
+LATENCY_SAMPLES = 10000
+
+PERCENTILES = (50, 90, 99)
+
+
+def search_move(black, white, symbol, time_limit=None, node_limit=None):
+    """
+    Return the move of a fresh AI in a position and the seconds it took,
+    it can run in any process
+    """
+    start = time.perf_counter()
+    game = OthelloGame.from_position((black, white), symbol)
+    move = game.current_player.best_move(
+        game, time_limit=time_limit, node_limit=node_limit)
+    return move, time.perf_counter() - start
+
+
+def init_worker(level="WARNING"):
+    """
+    Configure the logs of a worker process, the fork server does not share the
+    configuration of the server
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+
+
+def get_percentile(sorted_values, percentile):
+    """
+    Return a percentile of sorted values by the nearest rank method
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percentile // 100))
+    return sorted_values[rank - 1]
+
+
+class ServerMetrics:
+    """
+    Counters of a match server
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.games_started = 0
+        self.games_finished = 0
+        self.games_aborted = 0
+        self.time_losses = 0
+        self.moves = 0
+        # Seconds between the request of a move and the move, by player kind
+        self.latencies = {kind: deque(maxlen=LATENCY_SAMPLES)
+                          for kind in PLAYER_KINDS}
+
+    def add_move(self, kind, latency):
+        self.moves += 1
+        self.latencies[kind].append(latency)
+
+    def get_games_per_second(self):
+        """
+        Return the number of games finished per second since the server started
+        """
+        seconds = time.perf_counter() - self.start
+        return self.games_finished / seconds if seconds else 0.0
+
+    def to_dict(self, pool=None):
+        """
+        Return the metrics as a dictionary of JSON values, with the state of a search pool
+        """
+        latencies = {}
+        for kind, samples in self.latencies.items():
+            if samples:
+                values = sorted(samples)
+                latencies[kind] = {f"p{percentile}": round(get_percentile(values, percentile), 6)
+                                   for percentile in PERCENTILES}
+        metrics = {
+            "uptime": round(time.perf_counter() - self.start, 3),
+            "games_started": self.games_started,
+            "games_finished": self.games_finished,
+            "games_aborted": self.games_aborted,
+            "games_running": self.games_started - self.games_finished - self.games_aborted,
+            "time_losses": self.time_losses,
+            "moves": self.moves,
+            "games_per_second": round(self.get_games_per_second(), 3),
+            "move_latency": latencies,
+        }
+        if pool is not None:
+            metrics["queue_depth"] = pool.queue.qsize()
+            metrics["busy_workers"] = pool.busy
+            metrics["workers"] = pool.max_workers
+        return metrics
+
+
+class SearchPool:
+    """
+    Bounded pool of workers searching the moves of the AI
+    The searches wait in a queue until one of the `max_workers` workers is free.
+    The workers are processes, even a single one keeps the event loop free. If no
+    process can be started, the searches run in the threads of the event loop.
+    """
+
+    def __init__(self, max_workers=None):
+        # Workers forked by the server would inherit the sockets of its connections
+        # and keep them open, the fork server starts them from a clean process
+        context = None
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        self.max_workers, self.executor = create_process_pool(
+            max_workers, 1, mp_context=context, initializer=init_worker)
+        self.queue = asyncio.Queue()
+        self.busy = 0
+        self.tasks = []
+
+    def start(self):
+        """
+        Start the workers, in the running event loop
+        """
+        self.tasks = [asyncio.create_task(self.work())
+                      for _ in range(self.max_workers)]
+
+    async def search(self, game, time_limit=None, node_limit=None):
+        """
+        Queue the search of the current player of a game, return its move and
+        the seconds the search took
+        """
+        black, white = game.bitboards
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((black, white, game.current_player.symbol, time_limit, node_limit),
+                              future))
+        return await future
+
+    async def work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            arguments, future = await self.queue.get()
+            # The game of a search may have been aborted while it was waiting
+            if future.cancelled():
+                continue
+            self.busy += 1
+            try:
+                result = await loop.run_in_executor(self.executor, search_move, *arguments)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.busy -= 1
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+class LostOnTime(Exception):
+    """
+    Raised when a player did not move before the end of his clock
+    """
+
+
+class MatchSession:
+    """
+    One game hosted by the server, played by its own task
+    """
+
+    def __init__(self, server, connection, game_id, kinds, clock, seed=None):
+        self.server = server
+        self.connection = connection
+        self.game_id = game_id
+        # Kind of player of each color
+        self.kinds = kinds
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.game = OthelloGame()
+        self.game.set_players()
+        # Moves received from the connection for its client players, only accepted
+        # between a TURN line and the move it asks for
+        self.moves = asyncio.Queue()
+        self.is_waiting_move = False
+        self.task = None
+
+    async def run(self):
+        """
+        Play the game until its end and send its result
+        """
+        game = self.game
+        metrics = self.server.metrics
+        reason = "end"
+        loser = None
+        try:
+            while not game.is_game_over():
+                color = game.color
+                kind = self.kinds[color]
+                start = time.perf_counter()
+                try:
+                    move = await self.get_move(kind)
+                except LostOnTime:
+                    reason, loser = "time", color
+                    metrics.time_losses += 1
+                    break
+                except Exception:
+                    logger.exception("Game {} aborted, no move for {}", self.game_id, SYMBOLS[color])
+                    reason = "error"
+                    break
+                metrics.add_move(kind, time.perf_counter() - start)
+
+                game.place_piece(*move)
+                self.send("MOVE", SYMBOLS[color], *move)
+                # place_piece plays the pass of the opponent when he cannot move
+                if game.color == color and not game.is_game_over():
+                    self.send("PASS", SYMBOLS[1 - color])
+        except asyncio.CancelledError:
+            metrics.games_aborted += 1
+            raise
+        finally:
+            self.server.sessions.pop(self.game_id, None)
+            self.connection.sessions.pop(self.game_id, None)
+
+        black_score = game.get_player_score("B")
+        white_score = game.get_player_score("W")
+        if reason == "error":
+            metrics.games_aborted += 1
+            self.send("OVER", black_score, white_score, "-", reason)
+            return
+        metrics.games_finished += 1
+        if loser is not None:
+            winner = SYMBOLS[1 - loser]
+        elif black_score != white_score:
+            winner = "B" if black_score > white_score else "W"
+        else:
+            winner = "Tie"
+        self.send("OVER", black_score, white_score, winner, reason)
+
+    async def get_move(self, kind):
+        """
+        Return the move of the current player, raise LostOnTime if his clock runs out
+        """
+        game = self.game
+        if kind == "random":
+            return self.rng.choice(game.get_playable_positions())
+
+        if kind == "ai":
+            node_limit = self.server.node_limit
+            if node_limit is not None:
+                # A search bounded by its nodes has no clock, so that the game is reproducible
+                move, _ = await self.server.pool.search(game, float("inf"), node_limit)
+                return move
+            move, seconds = await self.server.pool.search(game, self.clock * SEARCH_SHARE)
+            if seconds > self.clock:
+                raise LostOnTime()
+            return move
+
+        black, white = game.bitboards
+        self.send("TURN", game.current_player.symbol,
+                  format_board(black, white), self.clock)
+        self.is_waiting_move = True
+        try:
+            return await asyncio.wait_for(self.get_client_move(), self.clock)
+        except asyncio.TimeoutError:
+            raise LostOnTime() from None
+        finally:
+            self.is_waiting_move = False
+            # Moves received with the one played were meant for a position the client never saw
+            while not self.moves.empty():
+                x, y = self.moves.get_nowait()
+                self.connection.send("ERROR", f"move {x} {y} out of turn in game {self.game_id}")
+
+    async def get_client_move(self):
+        """
+        Wait for a legal move of the client
+        """
+        while True:
+            move = await self.moves.get()
+            if self.game.is_playable_position(move):
+                return move
+            self.connection.send("ERROR", f"illegal move {move[0]} {move[1]} in game {self.game_id}")
+
+    def send(self, *words):
+        self.connection.send(words[0], self.game_id, *words[1:])
+
+
+class Connection:
+    """
+    Connection of a client and the games it started
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.sessions = {}
+
+    def send(self, *words):
+        if not self.writer.is_closing():
+            self.writer.write((" ".join(str(word) for word in words) + "\n").encode())
+
+
+class MatchServer:
+    """
+    Host the games of the clients connected over TCP or a Unix socket
+    """
+
+    def __init__(self, pool, clock=CLOCK, node_limit=None):
+        """
+        Initialize the server, the AI searches on `pool` within the clock of a move,
+        or up to `node_limit` nodes if it is given, for reproducible games
+        """
+        self.pool = pool
+        self.clock = clock
+        self.node_limit = node_limit
+        self.metrics = ServerMetrics()
+        self.sessions = {}
+        self.next_id = 0
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Start listening on a TCP port, or on a Unix socket if `path` is given,
+        and return the asyncio server
+        """
+        self.pool.start()
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path=path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode(errors="replace").split()
+                if not words:
+                    continue
+                if words[0].upper() == "QUIT":
+                    break
+                try:
+                    self.process_command(connection, words)
+                except ValueError as e:
+                    connection.send("ERROR", e)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for session in list(connection.sessions.values()):
+                session.task.cancel()
+            writer.close()
+
+    def process_command(self, connection, words):
+        """
+        Run a command of a client, raise ValueError if it is not valid
+        """
+        command, arguments = words[0].upper(), words[1:]
+        if command == "NEW":
+            if len(arguments) not in (2, 3) or not set(arguments[:2]) <= set(PLAYER_KINDS):
+                raise ValueError(
+                    f"usage: NEW <black> <white> [<clock>], players are {' '.join(PLAYER_KINDS)}")
+            clock = float(arguments[2]) if len(arguments) == 3 else self.clock
+            if clock <= 0:
+                raise ValueError("the clock must be positive")
+            self.start_session(connection, arguments[:2], clock)
+        elif command == "MOVE":
+            if len(arguments) != 3:
+                raise ValueError("usage: MOVE <id> <x> <y>")
+            game_id, x, y = (int(argument) for argument in arguments)
+            session = connection.sessions.get(game_id)
+            if session is None:
+                raise ValueError(f"no game {game_id}")
+            if not session.is_waiting_move:
+                raise ValueError(f"move {x} {y} out of turn in game {game_id}")
+            session.moves.put_nowait((x, y))
+        elif command == "STATS":
+            # Compact JSON, so that the metrics are one word of the line
+            connection.send("STATS", json.dumps(
+                self.metrics.to_dict(self.pool), separators=(",", ":")))
+        else:
+            raise ValueError(f"unknown command {words[0]}")
+
+    def start_session(self, connection, kinds, clock):
+        self.next_id += 1
+        session = MatchSession(self, connection, self.next_id,
+                               kinds, clock, seed=self.next_id)
+        self.sessions[session.game_id] = session
+        connection.sessions[session.game_id] = session
+        self.metrics.games_started += 1
+        connection.send("GAME", session.game_id, *kinds, clock)
+        session.task = asyncio.create_task(session.run())
+        return session
+
+    async def report(self, interval):
+        """
+        Log the metrics every `interval` seconds
+        """
+        while True:
+            await asyncio.sleep(interval)
+            logger.info("Metrics: {}", json.dumps(
+                self.metrics.to_dict(self.pool)))
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, workers=None, clock=CLOCK,
+                node_limit=None, report_interval=10.0):
+    """
+    Run a match server until it is cancelled
+    """
+    pool = SearchPool(workers)
+    server = MatchServer(pool, clock, node_limit)
+    try:
+        listener = await server.start(host, port, path)
+        logger.info("Match server listening on {}", path or f"{host}:{port}")
+        reporter = asyncio.create_task(server.report(report_interval))
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            reporter.cancel()
+    finally:
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Host concurrent Othello games over a line protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None,
+                        help="path of a Unix socket to listen on instead of TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of search processes (default: one per CPU)")
+    parser.add_argument("--clock", type=float, default=CLOCK,
+                        help="default clock of a move in seconds")
+    parser.add_argument("--nodes", type=int, default=None,
+                        help="node limit of an AI move, instead of its clock")
+    parser.add_argument("--report", type=float, default=10.0,
+                        help="seconds between two logs of the metrics")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.clock,
+                          args.nodes, args.report))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
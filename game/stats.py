@@ -0,0 +1,95 @@
+"""
+Statistics of the searches of the AI
+"""
+import json
+
+
+class SearchStats:
+    """
+    Counters of one search of Player.search, filled while it runs
+    """
+
+    def __init__(self, player_name):
+        self.player_name = player_name
+        self.move = None
+        self.score = None
+        self.nodes = 0
+        # Number of nodes that searched at least one move and moves they generated
+        self.interior_nodes = 0
+        self.generated_moves = 0
+        # cutoffs[i] is the number of cutoffs caused by the i-th move searched in a node
+        self.cutoffs = [0] * 64
+        # Number of nodes that failed low because of the stable pieces of the opponent
+        self.stability_cutoffs = 0
+        self.table_probes = 0
+        self.table_hits = 0
+        self.depth_reached = 0
+        self.seconds = 0.0
+        # One dictionary per completed depth: depth, move, score, nodes searched
+        # by this depth, seconds since the start and seconds spent on this depth
+        self.iterations = []
+        self.stopped = False
+        # The score is the exact final disc difference
+        self.solved = False
+        # Depth already reached by the search of the position while pondering
+        self.pondered_depth = 0
+
+    def get_table_hit_rate(self):
+        """
+        Return the ratio of the transposition table probes that found an entry
+        """
+        return self.table_hits / self.table_probes if self.table_probes else 0.0
+
+    def get_branching_factor(self):
+        """
+        Return the average number of moves of the positions that were expanded
+        """
+        return self.generated_moves / self.interior_nodes if self.interior_nodes else 0.0
+
+    def get_effective_branching_factor(self):
+        """
+        Return the growth of the nodes between the last two completed depths
+        """
+        if len(self.iterations) < 2:
+            return 0.0
+        previous, last = self.iterations[-2], self.iterations[-1]
+        return last["nodes"] / previous["nodes"] if previous["nodes"] else 0.0
+
+    def get_nodes_per_second(self):
+        """
+        Return the number of nodes searched per second
+        """
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        """
+        Return the statistics as a dictionary of JSON values
+        """
+        # Only keep the move indexes that caused a cutoff
+        last_index = max((index for index, count in enumerate(self.cutoffs) if count),
+                         default=-1)
+        return {
+            "player": self.player_name,
+            "move": list(self.move) if self.move is not None else None,
+            "score": self.score,
+            "nodes": self.nodes,
+            "nodes_per_second": round(self.get_nodes_per_second()),
+            "depth_reached": self.depth_reached,
+            "stopped": self.stopped,
+            "solved": self.solved,
+            "pondered_depth": self.pondered_depth,
+            "seconds": round(self.seconds, 6),
+            "cutoffs_by_move_index": self.cutoffs[:last_index + 1],
+            "stability_cutoffs": self.stability_cutoffs,
+            "table_probes": self.table_probes,
+            "table_hit_rate": round(self.get_table_hit_rate(), 4),
+            "branching_factor": round(self.get_branching_factor(), 3),
+            "effective_branching_factor": round(self.get_effective_branching_factor(), 3),
+            "iterations": self.iterations,
+        }
+
+    def to_json(self):
+        """
+        Return the statistics as one JSON line
+        """
+        return json.dumps(self.to_dict())
@@ -0,0 +1,87 @@
+"""
+Symmetries of the board
+
+The 8 rotations and reflections of the board (the dihedral group) are
+numbered 0 to 7: the bits of a transform select a vertical flip, a
+horizontal flip and a transposition, applied in this order. The canonical
+form of a position is the smallest of its 8 images, so the positions
+equivalent by symmetry share it. The transform that gave it maps the moves
+of the position to the canonical orientation, its inverse maps them back.
+"""
+from game import bitboard
+
+FLIP_VERTICAL = 1
+FLIP_HORIZONTAL = 2
+TRANSPOSE = 4
+
+IDENTITY = 0
+TRANSFORMS = range(8)
+
+
+def transform(bitboards, index):
+    """
+    Apply a transform to a bitboard
+    Also works on NumPy uint64 arrays
+    """
+    if index & FLIP_VERTICAL:
+        bitboards = bitboard.flip_vertical(bitboards)
+    if index & FLIP_HORIZONTAL:
+        bitboards = bitboard.flip_horizontal(bitboards)
+    if index & TRANSPOSE:
+        bitboards = bitboard.transpose(bitboards)
+    return bitboards
+
+
+def _inverse(index):
+    """
+    Return the transform undoing a transform
+    """
+    # A board whose 8 images are all different
+    board = 0x0000000000000107
+    image = transform(board, index)
+    return next(other for other in TRANSFORMS if transform(image, other) == board)
+
+
+# INVERSES[index] undoes the transform index
+INVERSES = [_inverse(index) for index in TRANSFORMS]
+
+
+def get_images(bitboards):
+    """
+    Return the 8 images of a bitboard, the image i is transform(bitboards, i)
+    """
+    vertical = bitboard.flip_vertical(bitboards)
+    images = [bitboards, vertical, bitboard.flip_horizontal(bitboards),
+              bitboard.flip_horizontal(vertical)]
+    return images + [bitboard.transpose(image) for image in images]
+
+
+def canonicalize(bitboards):
+    """
+    Return the canonical form of a position given as (black, white) bitboards
+    and the transform that maps the position to it
+    """
+    black, white = bitboards
+    canonical, index = min(zip(zip(get_images(black), get_images(white)), TRANSFORMS))
+    return canonical, index
+
+
+def transform_square(square_index, index):
+    """
+    Return the bit index of a square once transformed
+    """
+    return transform(1 << square_index, index).bit_length() - 1
+
+
+def transform_move(move, index):
+    """
+    Return the (x, y) cell of a move once transformed
+    """
+    return bitboard.position(transform_square(bitboard.square(*move), index))
+
+
+def untransform_move(move, index):
+    """
+    Map a move of the transformed position back to the original position
+    """
+    return transform_move(move, INVERSES[index])
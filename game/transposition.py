@@ -0,0 +1,80 @@
+"""
+Transposition table of the AI search
+"""
+
+# Kind of score stored in an entry
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results indexed by Zobrist key
+
+    Each bucket holds two entries: the first one keeps the deepest search
+    and the second one is always replaced, so the memory used never grows.
+    An entry of a previous root search loses its place in the first slot
+    whatever its depth, so the results of past moves do not stay forever.
+    An entry is a tuple (key, depth, bound, score, move, generation).
+    """
+
+    def __init__(self, size=1 << 16):
+        """
+        Initialize the table with `size` buckets, rounded down to a power of two
+        """
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * (self.size * 2)
+        self.probes = 0
+        self.hits = 0
+        # Number of the current root search, see new_search
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Start a new root search, the entries stored so far become replaceable
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """
+        Return the entry stored for a key or None
+        """
+        self.probes += 1
+        index = (key & self.mask) << 1
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.entries[index + 1]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Store a search result, replacing a shallower or older one if needed
+        """
+        index = (key & self.mask) << 1
+        entry = (key, depth, bound, score, move, self.generation)
+        deepest = self.entries[index]
+        if deepest is None or deepest[0] == key or deepest[1] <= depth or deepest[5] != self.generation:
+            self.entries[index] = entry
+        else:
+            self.entries[index + 1] = entry
+
+    def clear(self):
+        """
+        Remove all the entries
+        """
+        self.entries = [None] * (self.size * 2)
+        self.probes = 0
+        self.hits = 0
+
+    def get_hit_rate(self):
+        """
+        Return the ratio of probes that found an entry
+        """
+        return self.hits / self.probes if self.probes else 0.0
@@ -0,0 +1,44 @@
+"""
+Zobrist keys of the Othello positions
+
+The key of a position is the xor of one random 64-bit number per piece
+and of SIDE_KEY when white is to move, so it can be updated incrementally
+when pieces are placed or flipped.
+"""
+import random
+
+_random = random.Random(0x07E110)
+
+# PIECE_KEYS[color][square]
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(2)]
+
+# Xor of the keys of both colors, toggles a flipped piece
+FLIP_KEYS = [black ^ white for black, white in zip(*PIECE_KEYS)]
+
+SIDE_KEY = _random.getrandbits(64)
+
+
+def get_hash(bitboards, color):
+    """
+    Compute from scratch the key of a position with `color` to move
+    """
+    key = SIDE_KEY if color == 1 else 0
+    for board_color, board in enumerate(bitboards):
+        keys = PIECE_KEYS[board_color]
+        while board:
+            lowest_bit = board & -board
+            key ^= keys[lowest_bit.bit_length() - 1]
+            board ^= lowest_bit
+    return key
+
+
+def get_flips_hash(flips):
+    """
+    Return the xor of the keys toggling the flipped pieces
+    """
+    key = 0
+    while flips:
+        lowest_bit = flips & -flips
+        key ^= FLIP_KEYS[lowest_bit.bit_length() - 1]
+        flips ^= lowest_bit
+    return key
@@ -1,6 +1,6 @@
 import pygame
 from view.screen import MainMenu, PlayScreen
-from constants.events import START_HUMAN_VS_HUMAN_EVENT, START_HUMAN_VS_AI_EVENT, GAME_IS_OVER_EVENT
+from constants.events import START_HUMAN_VS_HUMAN_EVENT, START_HUMAN_VS_AI_EVENT, GAME_IS_OVER_EVENT, AI_MOVE_EVENT
 import random
 import pyautogui
 
@@ -20,25 +20,29 @@ while running:
         elif event.type == START_HUMAN_VS_HUMAN_EVENT:
             # players = (Player("Player 1", "B"), Player("Player 2", "W"))
             current_screen = play_screen
-            current_screen.game.set_players(is_playing_against_ai=False)
+            current_screen.start_game(is_playing_against_ai=False)
         elif event.type == START_HUMAN_VS_AI_EVENT:
             # players = (Player("Player 1", "B"),
             #            Player("AI", "W", is_ai=True))
             current_screen = play_screen
-            current_screen.game.set_players(is_playing_against_ai=True)
+            current_screen.start_game(is_playing_against_ai=True)
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if current_screen == play_screen:
                 current_screen.process_mouse_click()
+        elif event.type == AI_MOVE_EVENT:
+            play_screen.process_ai_move(event)
         elif event.type == GAME_IS_OVER_EVENT:
             click = pyautogui.alert(
                 title="Game is over!", text=f"{current_screen.game.get_winner()}", button="OK")
             if click == "OK":
+                play_screen.ai_worker.cancel()
                 exit(0)
 
-    for visual_component in current_screen.visual_components:
-        visual_component.process()
+    current_screen.process_components()
 
     current_screen.draw()
     clock.tick(60)
 
+# Stop the search of the AI before leaving
+play_screen.ai_worker.cancel()
 pygame.quit()
@@ -0,0 +1,75 @@
+"""
+Tests of the parallel mode of the search, see game.parallel
+"""
+import time
+
+from benchmarks.positions import MIDGAME_POSITIONS
+from game import bitboard
+from game.othello import OthelloGame
+from game.parallel import ParallelSearch
+
+
+def make_game():
+    black, white, symbol = MIDGAME_POSITIONS["midgame-28"]
+    game = OthelloGame.from_position((black, white), symbol)
+    game.current_player.use_book = False
+    return game
+
+
+def search(game, parallel_search=None, **budget):
+    """
+    Search a game with the parallel mode of its current player
+    """
+    player = game.current_player
+    player.search_workers = 2
+    player.parallel_search = parallel_search
+    try:
+        return player.search(game, **budget)
+    finally:
+        player.close()
+
+
+def is_legal(game, move):
+    return bool(game.get_playable_bitboard() >> bitboard.square(*move) & 1)
+
+
+def test_root_search_does_not_depend_on_the_workers():
+    game = make_game()
+    with ParallelSearch(1) as single, ParallelSearch(2) as parallel:
+        assert single.search_root(game, 3) == parallel.search_root(game, 3)
+
+
+def test_root_search_matches_the_serial_search():
+    game = make_game()
+    player = game.current_player
+    move = None
+    with ParallelSearch(1) as parallel:
+        for depth in range(1, 5):
+            move, score = player.search_root(game, depth, move)
+            assert parallel.search_root(game, depth, move)[1] == score
+
+
+def test_search_stays_within_the_node_limit():
+    results = []
+    # In this process, then over two worker processes
+    for parallel_search in (ParallelSearch(1), None):
+        game = make_game()
+        stats = search(game, parallel_search, time_limit=60, node_limit=20000)
+        assert is_legal(game, stats.move)
+        assert stats.depth_reached >= 2
+        assert not stats.solved
+        # Including the nodes of the depth that was not completed
+        assert stats.nodes <= 20000
+        results.append([(iteration["depth"], iteration["move"], iteration["score"], iteration["nodes"])
+                        for iteration in stats.iterations])
+    # With a node limit the search is reproducible
+    assert results[0] == results[1]
+
+
+def test_search_stays_within_the_time_limit():
+    game = make_game()
+    start = time.perf_counter()
+    stats = search(game, time_limit=0.5)
+    assert time.perf_counter() - start < 1.5
+    assert is_legal(game, stats.move)
+    assert stats.depth_reached >= 1
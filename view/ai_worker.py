@@ -0,0 +1,113 @@
+import threading
+import pygame
+from constants.events import AI_MOVE_EVENT
+from loguru import logger
+
+
+class AIWorker:
+    """
+    Run the search of the AI in a background thread so the window keeps
+    rendering and handling events while the AI is thinking
+
+    The search works on a snapshot of the game, its move is posted as an
+    AI_MOVE_EVENT with the id of the search that found it. While the human
+    is thinking, the AI can ponder his replies in the same thread.
+    """
+
+    def __init__(self):
+        self.thread = None
+        self.stop_event = None
+        self.search_id = 0
+        self.is_busy = False
+        # Zobrist key of the position being pondered, None if the AI is not pondering
+        self.pondered_hash = None
+
+    def start(self, game):
+        """
+        Start searching the move of the current player of a game
+        Nothing is done if a search is already running or waiting to be applied
+        """
+        if self.is_busy:
+            return
+        self.cancel()
+
+        self.search_id += 1
+        self.stop_event = threading.Event()
+        self.is_busy = True
+        self.thread = threading.Thread(
+            target=self.search,
+            args=(game.copy(), self.search_id, self.stop_event),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def ponder(self, game, player):
+        """
+        Let an AI player search the replies of his opponent, the current player of a game,
+        until the next search or cancel
+        Nothing is done if this position is already pondered or a search is running
+        """
+        if self.is_busy or self.pondered_hash == game.get_hash():
+            return
+        self.cancel()
+
+        self.pondered_hash = game.get_hash()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run_ponder,
+            args=(game.copy(), player, self.stop_event),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def run_ponder(self, snapshot, player, stop_event):
+        """
+        Ponder a snapshot until the pondering is stopped
+        """
+        try:
+            player.ponder(snapshot, stop_event)
+        except Exception as e:
+            logger.error(e)
+
+    def search(self, snapshot, search_id, stop_event):
+        """
+        Search the best move of a snapshot and post it, unless the search was cancelled
+        """
+        move = None
+        try:
+            move = snapshot.current_player.best_move(
+                snapshot, stop_event=stop_event)
+        except Exception:
+            # Keep the game going with a legal move rather than waiting for the AI forever
+            logger.exception("The search of the AI failed, it plays its first legal move")
+            positions = snapshot.get_playable_positions()
+            move = positions[0] if positions else None
+        finally:
+            # Without a move to post, the next frame must be able to start a new search
+            if move is None and search_id == self.search_id:
+                self.is_busy = False
+        if move is not None and not stop_event.is_set():
+            pygame.event.post(pygame.event.Event(
+                AI_MOVE_EVENT, move=move, search_id=search_id))
+
+    def take_move(self, event):
+        """
+        Return the move of an AI_MOVE_EVENT, or None if it comes from a stale search
+        """
+        if event.search_id != self.search_id or not self.is_busy:
+            return None
+        self.is_busy = False
+        return event.move
+
+    def cancel(self):
+        """
+        Stop the running search or pondering, the move of the search will never be posted
+        """
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        self.stop_event = None
+        self.is_busy = False
+        self.pondered_hash = None
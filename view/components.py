@@ -1,7 +1,29 @@
 import pygame
 
+FONT_PATH = "assets/font/TechnoRaceItalic.otf"
+
+# Fonts shared by all the screens and components, by (path, size)
+_fonts = {}
+
+
+def get_font(size, path=FONT_PATH):
+    """
+    Return a font, loaded on first use
+    """
+    key = (path, size)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.SysFont(path, size)
+    return _fonts[key]
+
 
 class Button(pygame.sprite.Sprite):
+    """
+    Button drawn on a screen, created once with its screen
+
+    Its surfaces are rendered once for each hover state, process() only
+    redraws the button when the mouse enters or leaves it.
+    """
+
     def __init__(self, screen=None, position=(0, 0), size=(10, 10), text="Button", background_color=(0, 0, 0), text_color=(0, 0, 0), hovered_color=(0, 0, 0), border_color=None, font_size=30, on_click_function=None, one_press=False):
         super().__init__()
         self.x, self.y = position
@@ -17,21 +39,42 @@ class Button(pygame.sprite.Sprite):
         self.font_size = font_size
         self.border_color = border_color
 
-        self.button_surface = pygame.Surface((self.width, self.height))
-        self.button_surface.fill(self.background_color)
         self.button_rect = pygame.Rect(self.x, self.y, self.width, self.height)
+        self.button_surf = get_font(self.font_size).render(
+            self.text, True, self.text_color)
 
-        self.button_surf = pygame.font.SysFont(
-            'assets/TechnoRaceItalic.otf', self.font_size).render(self.text, True, self.text_color)
+        # Surface of the button when it is not hovered and when it is
+        self.surfaces = (self.render(self.background_color),
+                         self.render(self.hovered_color))
+        # Hover state of the button on the screen, None if it is not drawn
+        self.is_hovered = None
 
-    def process(self):
-        # Reset button color
-        self.button_surface.fill(self.background_color)
+    def render(self, color):
+        """
+        Return the surface of the button filled with a color
+        """
+        button_surface = pygame.Surface((self.width, self.height))
+        button_surface.fill(color)
+        button_surface.blit(self.button_surf, [
+            self.button_rect.width / 2 - self.button_surf.get_rect().width / 2,
+            self.button_rect.height / 2 - self.button_surf.get_rect().height / 2
+        ])
+        return button_surface
 
+    def draw(self, is_hovered=False):
+        """
+        Draw the button on its screen and return the rectangle drawn
+        """
+        self.is_hovered = is_hovered
+        return self.screen.blit(self.surfaces[is_hovered], self.button_rect)
+
+    def process(self):
+        """
+        Handle the clicks on the button, return the rectangle redrawn or None
+        """
         mouse_position = pygame.mouse.get_pos()
-        if self.button_rect.collidepoint(mouse_position):
-            # Button is hovered
-            self.button_surface.fill(self.hovered_color)
+        is_hovered = self.button_rect.collidepoint(mouse_position)
+        if is_hovered:
             if pygame.mouse.get_pressed(num_buttons=3)[0]:
                 # Button is pressed
                 if self.one_press:
@@ -42,12 +85,11 @@ class Button(pygame.sprite.Sprite):
             else:
                 self.already_pressed = False
 
-        self.button_surface.blit(self.button_surf, [
-            self.button_rect.width / 2 - self.button_surf.get_rect().width / 2,
-            self.button_rect.height / 2 - self.button_surf.get_rect().height / 2
-        ])
-
-        self.screen.blit(self.button_surface, self.button_rect)
+        if is_hovered == self.is_hovered:
+            return None
+        return self.draw(is_hovered)
 
     def delete(self):
         self.screen.fill((0, 0, 0), self.button_rect)
+        self.is_hovered = None
+        self.kill()
@@ -1,11 +1,20 @@
 import pygame
 from view.color import BACKGROUND_COLOR, WHITE, BLACK
-from view.components import Button
-from constants.events import START_HUMAN_VS_HUMAN_EVENT, START_HUMAN_VS_AI_EVENT
-from game.othello import OthelloGame
+from view.components import Button, get_font
+from view.ai_worker import AIWorker
+from constants.events import START_HUMAN_VS_HUMAN_EVENT, START_HUMAN_VS_AI_EVENT, GAME_IS_OVER_EVENT
+from game.othello import OthelloGame, GameState
+from game import bitboard
 from loguru import logger
 
 
+def post_game_over(game):
+    """
+    Tell the main loop that a game is over, the OthelloGame.on_game_over callback of the interface
+    """
+    pygame.event.post(pygame.event.Event(GAME_IS_OVER_EVENT))
+
+
 class Screen:
     def __init__(self, width=1280, height=720, title="Othello", background=BACKGROUND_COLOR):
         self.width = width
@@ -21,17 +30,82 @@ class Screen:
         self.icons["icon"] = pygame.image.load("assets/icon/icon.jpg")
         pygame.display.set_icon(self.icons["icon"])
 
-        self.fonts = {}
+        self.texts = {}
+
+        # Regions of the screen changed since the last display update,
+        # the whole screen is updated when needs_full_update is set
+        self.dirty_rects = []
+        self.needs_full_update = True
+
+        self.create_components()
+
+    def create_components(self):
+        """
+        Create the visual components of the screen, called once by __init__
+        """
+
+    def show(self):
+        """
+        Make the screen current, the next draw redraws it entirely
+        """
+        self.needs_full_update = True
 
     def get_font(self, size):
-        if size not in self.fonts:
-            self.fonts[size] = pygame.font.SysFont(
-                "assets/font/TechnoRaceItalic.otf", size)
-        return self.fonts[size]
+        return get_font(size)
+
+    def get_text(self, text, size, color=WHITE):
+        """
+        Return the surface of a text, rendered on first use
+        """
+        key = (text, size, color)
+        if key not in self.texts:
+            self.texts[key] = self.get_font(size).render(text, True, color)
+        return self.texts[key]
+
+    def blit_text(self, surface, text, size, center):
+        """
+        Draw a text centered on a point of a surface and return its rectangle
+        """
+        text_surface = self.get_text(text, size)
+        text_rect = text_surface.get_rect()
+        text_rect.center = center
+        surface.blit(text_surface, text_rect)
+        return text_rect
+
+    def add_dirty_rect(self, rect):
+        """
+        Mark a region of the screen to be updated by the next draw
+        """
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def draw_components(self):
+        """
+        Draw all the visual components, after the screen was cleared
+        """
+        for visual_component in self.visual_components:
+            visual_component.draw()
+
+    def process_components(self):
+        """
+        Let the visual components handle the mouse and redraw themselves
+        A component returns the rectangle it redrew, or None
+        """
+        for visual_component in self.visual_components:
+            rect = visual_component.process()
+            if rect is not None:
+                self.add_dirty_rect(rect)
 
     def draw(self):
+        """
+        Update the regions of the display that changed, nothing when the screen is idle
+        """
         try:
-            pygame.display.update()
+            if self.needs_full_update:
+                pygame.display.update()
+                self.needs_full_update = False
+            elif self.dirty_rects:
+                pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
         except Exception as e:
             logger.error(e)
 
@@ -40,13 +114,7 @@ class MainMenu(Screen):
     def __init__(self, width, height, title, background=BACKGROUND_COLOR):
         super().__init__(width, height, title, background=background)
 
-    def draw(self):
-        # Add the title
-        title = self.get_font(100).render("Othello", True, WHITE)
-        title_rect = title.get_rect()
-        title_rect.center = (self.width / 2, 100)
-        self.screen.blit(title, title_rect)
-
+    def create_components(self):
         # Add the buttons
         human_vs_human_button = Button(
             self.screen,
@@ -90,6 +158,14 @@ class MainMenu(Screen):
         self.visual_components.add(
             human_vs_human_button, human_vs_ai_button, quit_button)
 
+    def draw(self):
+        # The background, the title and the buttons are only drawn entirely
+        # once, then the buttons redraw themselves when they are hovered
+        if self.needs_full_update:
+            self.screen.fill(self.background)
+            self.blit_text(self.screen, "Othello", 100, (self.width / 2, 100))
+            self.draw_components()
+
         # Call the parent draw method
         super().draw()
 
@@ -105,14 +181,50 @@ class MainMenu(Screen):
 
 
 class PlayScreen(Screen):
+    # Size of a cell of the board in pixels
+    CELL_SIZE = 90
+
     def __init__(self, width, height, title, background=BACKGROUND_COLOR):
         super().__init__(width, height, title, background=background)
         self.game = OthelloGame()
+        self.game.on_game_over = post_game_over
+        self.ai_worker = AIWorker()
+
+        self.board_background = self.create_board_background()
+        self.information_background = self.create_information_background()
+        self.cell_sprites = {}
+        self.show()
+
+    def start_game(self, is_playing_against_ai=False):
+        """
+        Start a new game, the search of the previous game is cancelled
+        """
+        self.ai_worker.cancel()
+        self.game = OthelloGame()
+        self.game.on_game_over = post_game_over
+        self.game.set_players(is_playing_against_ai=is_playing_against_ai)
+        self.show()
+
+    def show(self):
+        super().show()
+        self.reset_rendering()
+
+    def reset_rendering(self):
+        """
+        Forget what was drawn, the next draw redraws the whole screen
+        """
+        # Content of each cell of the board as last drawn
+        self.drawn_cells = [[None] * 8 for _ in range(8)]
+        self.drawn_position = None
+        self.drawn_information = None
 
     def draw(self):
         # Divide the screen in two parts
         # First part on the left is the board 720x720, 8x8 grid
         # Second part on the right is the information panel 560x720
+        if self.needs_full_update:
+            self.screen.blit(self.board_background, (0, 0))
+            self.screen.blit(self.information_background, (720, 0))
 
         # Draw the board
         self.draw_game_board()
@@ -123,100 +235,139 @@ class PlayScreen(Screen):
         # Call the parent draw method
         super().draw()
 
-        # If playing against AI, let the AI play
-        if self.game.is_playing_against_ai and self.game.current_player.is_ai:
-            self.game.current_player.place_piece(
-                None, None, self.game)
-
-    def draw_game_board(self):
-        # Draw the board
+        # If playing against AI, let the AI search its move in the background,
+        # or ponder the replies of the human while he is thinking
+        if self.game.is_playing_against_ai and self.game.state == GameState.PLAYING:
+            if self.game.current_player.is_ai:
+                self.ai_worker.start(self.game)
+            else:
+                self.ai_worker.ponder(self.game, self.game.other_player(self.game.current_player))
+
+    def process_ai_move(self, event):
+        """
+        Play the move found by the AI, if it was searched for the current game
+        """
+        move = self.ai_worker.take_move(event)
+        player = self.game.current_player
+        if move is None or not player.is_ai:
+            return
+        self.game.place_piece(move[0], move[1])
+        logger.info("{} is placing a piece at ({}, {})",
+                    player.name, move[0], move[1])
+
+    def create_board_background(self):
+        """
+        Return the surface of the empty board with its grid
+        """
         board = pygame.Surface((720, 720))
         board.fill(BACKGROUND_COLOR)
 
         # Draw the grid
         for i in range(8):
             for j in range(8):
-                pygame.draw.rect(board, WHITE, (i * 90, j * 90, 90, 90), 1)
-
-        # Draw the pieces
-        for i in range(8):
-            for j in range(8):
-                if self.game.board[i][j] == "W":
-                    pygame.draw.circle(
-                        board, WHITE, (i * 90 + 45, j * 90 + 45), 40)
-                elif self.game.board[i][j] == "B":
-                    pygame.draw.circle(
-                        board, BLACK, (i * 90 + 45, j * 90 + 45), 40)
-
-        # Get the playable positions
-        playable_positions = self.game.get_playable_positions()
-
-        # Draw the playable positions with a gray empty circle
-        for playable_position in playable_positions:
-            pygame.draw.circle(
-                board, (128, 128, 128), (playable_position[0] * 90 + 45, playable_position[1] * 90 + 45), 40)
+                pygame.draw.rect(board, WHITE, (i * self.CELL_SIZE, j * self.CELL_SIZE,
+                                                self.CELL_SIZE, self.CELL_SIZE), 1)
+        return board
+
+    def get_cell_sprite(self, cell):
+        """
+        Return the surface of a cell of the board, rendered on first use
+        `cell` is (symbol of the piece or None, is playable, is the last move)
+        """
+        if cell not in self.cell_sprites:
+            symbol, is_playable, is_last_move = cell
+            center = (self.CELL_SIZE // 2, self.CELL_SIZE // 2)
+            # Every cell of the background is the same, with its border
+            sprite = self.board_background.subsurface(
+                (0, 0, self.CELL_SIZE, self.CELL_SIZE)).copy()
+            if symbol == "W":
+                pygame.draw.circle(sprite, WHITE, center, 40)
+            elif symbol == "B":
+                pygame.draw.circle(sprite, BLACK, center, 40)
+            elif is_playable:
+                # Draw the playable positions with a gray circle
+                pygame.draw.circle(sprite, (128, 128, 128), center, 40)
+            if is_last_move:
+                pygame.draw.circle(sprite, (255, 0, 0), center, 5)
+            self.cell_sprites[cell] = sprite
+        return self.cell_sprites[cell]
 
+    def draw_game_board(self):
+        """
+        Redraw the cells of the board whose content changed since the last draw
+        """
+        black, white = self.game.bitboards
         last_move = self.game.last_move
-        if last_move is not None:
-            pygame.draw.circle(
-                board, (255, 0, 0), (last_move[0] * 90 + 45, last_move[1] * 90 + 45), 5)
-
-        # Add the board to the screen
-        self.screen.blit(board, (0, 0))
+        position = (black, white, self.game.current_player.symbol, last_move)
+        if position == self.drawn_position:
+            return
+        self.drawn_position = position
 
-    def draw_information_panel(self):
-        # Draw the information panel
+        playable = self.game.get_playable_bitboard()
+        for i in range(8):
+            for j in range(8):
+                square = bitboard.square(i, j)
+                if black >> square & 1:
+                    symbol = "B"
+                elif white >> square & 1:
+                    symbol = "W"
+                else:
+                    symbol = None
+                cell = (symbol, bool(playable >> square & 1), last_move == (i, j))
+                if cell == self.drawn_cells[i][j]:
+                    continue
+                self.drawn_cells[i][j] = cell
+                rect = self.screen.blit(self.get_cell_sprite(cell),
+                                        (i * self.CELL_SIZE, j * self.CELL_SIZE))
+                self.add_dirty_rect(rect)
+
+    def create_information_background(self):
+        """
+        Return the surface of the information panel without the current player and the scores
+        """
         information_panel = pygame.Surface((560, 720))
         information_panel.fill(BACKGROUND_COLOR)
 
-        # Add a title to the information panel
-        title = self.get_font(50).render("Othello", True, WHITE)
-        title_rect = title.get_rect()
-        title_rect.center = (280, 50)
-        information_panel.blit(title, title_rect)
-
-        # Add a subtitle to the information panel
-        subtitle = self.get_font(30).render("Informations", True, WHITE)
-        subtitle_rect = subtitle.get_rect()
-        subtitle_rect.center = (280, 90)
-        information_panel.blit(subtitle, subtitle_rect)
-
-        # Add the current player and under the text a circle with the color of the current player
-        current_player_text = self.get_font(
-            30).render("Current Player", True, WHITE)
-        current_player_text_rect = current_player_text.get_rect()
-        current_player_text_rect.center = (280, 250)
-        information_panel.blit(current_player_text, current_player_text_rect)
+        # Add a title and a subtitle to the information panel
+        self.blit_text(information_panel, "Othello", 50, (280, 50))
+        self.blit_text(information_panel, "Informations", 30, (280, 90))
 
-        # Add the current player circle
-        if self.game.current_player.symbol == "W":
-            pygame.draw.circle(information_panel, WHITE, (280, 350), 40)
-        else:
-            pygame.draw.circle(information_panel, BLACK, (280, 350), 40)
-
-        # Add the score
-        score_text = self.get_font(30).render("Score", True, WHITE)
-        score_text_rect = score_text.get_rect()
-        score_text_rect.center = (280, 450)
-        information_panel.blit(score_text, score_text_rect)
-
-        # Draw a circle for the white player and right the score next to it
-        pygame.draw.circle(information_panel, WHITE, (245, 550), 40)
-        white_score = self.get_font(30).render(
-            str(self.game.get_player_score("W")), True, WHITE)
-        white_score_rect = white_score.get_rect()
-        white_score_rect.center = (245, 650)
-        information_panel.blit(white_score, white_score_rect)
+        # The circle with the color of the current player is drawn under this text
+        self.blit_text(information_panel, "Current Player", 30, (280, 250))
 
-        # Draw a circle for the black player and right the score next to it
+        # The score of each player is drawn under its circle
+        self.blit_text(information_panel, "Score", 30, (280, 450))
+        pygame.draw.circle(information_panel, WHITE, (245, 550), 40)
         pygame.draw.circle(information_panel, BLACK, (345, 550), 40)
-        black_score = self.get_font(30).render(
-            str(self.game.get_player_score("B")), True, WHITE)
-        black_score_rect = black_score.get_rect()
-        black_score_rect.center = (345, 650)
-        information_panel.blit(black_score, black_score_rect)
+        return information_panel
+
+    def draw_information_panel(self):
+        """
+        Redraw the current player and the scores when they changed since the last draw
+        """
+        information = (self.game.current_player.symbol,
+                       self.game.get_player_score("W"), self.game.get_player_score("B"))
+        if information == self.drawn_information:
+            return
+        self.drawn_information = information
+        symbol, white_score, black_score = information
 
-        self.screen.blit(information_panel, (720, 0))
+        # Add the current player circle
+        current_player_rect = pygame.Rect(720 + 240, 310, 80, 80)
+        self.screen.blit(self.information_background, current_player_rect,
+                         current_player_rect.move(-720, 0))
+        pygame.draw.circle(self.screen, WHITE if symbol == "W" else BLACK,
+                           current_player_rect.center, 40)
+        self.add_dirty_rect(current_player_rect)
+
+        # Add the scores under the circles of the players
+        for score, center in ((white_score, (720 + 245, 650)), (black_score, (720 + 345, 650))):
+            score_rect = pygame.Rect(0, 0, 90, 40)
+            score_rect.center = center
+            self.screen.blit(self.information_background, score_rect,
+                             score_rect.move(-720, 0))
+            self.blit_text(self.screen, str(score), 30, center)
+            self.add_dirty_rect(score_rect)
 
     def process_mouse_click(self):
         # Get the position of the mouse